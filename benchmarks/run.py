@@ -0,0 +1,288 @@
+"""
+Load / benchmark สำหรับ WebSocket /failures/ws/* และ GET /calibration/
+
+รันแอปจริงใน process เดียวกัน (uvicorn) ต่อกับ DB ในเครื่องที่ seed ข้อมูลสังเคราะห์ไว้
+และใช้ fakeredis แทน Redis จากนั้นยิง WebSocket client N ตัว + HTTP request
+แล้วรายงาน throughput, p50/p99 latency, DB queries/sec และหน่วยความจำ
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks --db-url "mssql+pyodbc://localhost\\SQLEXPRESS/dashboard_bench?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes"
+    python -m benchmarks --db-url sqlite:///.local/bench.db    # ไม่ต้องมี SQL Server (ตัวเลขเทียบกันเองได้ แต่ไม่แทน MSSQL)
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+DEFAULT_DB_URL = os.getenv(
+    "BENCH_DB_URL",
+    "mssql+pyodbc://localhost\\SQLEXPRESS/dashboard_bench"
+    "?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes",
+)
+WS_ENDPOINTS = ("filter", "station", "fixture", "tester")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", default=DEFAULT_DB_URL, help="stand-in database (ห้ามชี้ไป production)")
+    parser.add_argument("--no-seed", action="store_true", help="ใช้ข้อมูลที่ seed ไว้แล้ว")
+    parser.add_argument("--lines", type=int, default=3, help="จำนวน line สังเคราะห์")
+    parser.add_argument("--days", type=int, default=30, help="จำนวนวันย้อนหลัง")
+    parser.add_argument("--rows-per-day", type=int, default=2_000, help="fail ต่อ line ต่อวัน (เฉลี่ย)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clients", type=int, default=50, help="จำนวน WebSocket client")
+    parser.add_argument("--endpoints", default="filter", help=f"คั่นด้วย , จาก {','.join(WS_ENDPOINTS)}")
+    parser.add_argument("--range-days", type=int, default=7, help="ช่วงวันที่ client แต่ละตัวขอ")
+    parser.add_argument("--duration", type=float, default=30.0, help="วินาทีที่ client แต่ละตัวเปิดค้าง")
+    parser.add_argument("--interval", type=float, default=1.0, help="UPDATE_INTERVAL_SEC ของ socket ระหว่าง bench")
+    parser.add_argument("--cache-ttl", type=int, default=5, help="CACHE_TTL_SEC ของ socket ระหว่าง bench")
+    parser.add_argument("--http-requests", type=int, default=200, help="จำนวน GET /calibration/")
+    parser.add_argument("--http-concurrency", type=int, default=10)
+    parser.add_argument("--json", dest="json_path", help="เขียนผลเป็น JSON ลงไฟล์นี้ด้วย")
+    return parser.parse_args(argv)
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    # nearest-rank
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def latency_summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50Ms": round(percentile(values, 50) * 1000, 2) if values else None,
+        "p99Ms": round(percentile(values, 99) * 1000, 2) if values else None,
+        "maxMs": round(max(values) * 1000, 2) if values else None,
+    }
+
+
+def memory_mb() -> float | None:
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+        # Linux รายงานเป็น KB (peak)
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_app(args):
+    """
+    ต้องตั้ง DATABASE_URL และแทน Redis ก่อน import router (router bind client ตอน import)
+    """
+    os.environ["DATABASE_URL"] = args.db_url
+    os.environ["DATABASE_READ_URL"] = args.db_url
+    os.environ["REDIS_BACKEND"] = "memory"
+    if args.db_url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(args.db_url[len("sqlite:///"):])), exist_ok=True)
+
+    import importlib
+    from sqlalchemy import event
+    from db.session import get_engine, get_read_engine
+
+    # routers/__init__.py ผูกชื่อ module กับ APIRouter จึงต้องดึง module จาก import_module
+    for name in ("failure_filter_router", "failure_station_router", "failure_fixture_router", "failure_tester_router"):
+        module = importlib.import_module(f"routers.{name}")
+        module.UPDATE_INTERVAL_SEC = args.interval
+        module.CACHE_TTL_SEC = args.cache_ttl
+
+    db_counter = {"queries": 0}
+
+    def count_query(*_):
+        db_counter["queries"] += 1
+
+    engine = get_engine()
+    for counted in (engine, get_read_engine()):
+        event.listen(counted, "after_cursor_execute", count_query)
+
+    from main import app
+    return app, engine, db_counter
+
+
+def start_server(app, port: int):
+    import uvicorn
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline or not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def ws_url(base: str, endpoint: str, line_id: str, start: date, end: date) -> str:
+    if endpoint == "station":
+        return f"{base}/failures/ws/station?lineId={line_id}&station=ATS1&workDate={end}"
+    return f"{base}/failures/ws/{endpoint}?lineId={line_id}&startDate={start}&endDate={end}"
+
+
+async def ws_client(url: str, duration: float, result: dict):
+    import websockets
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            deadline = started + duration
+            last = started
+            received = 0
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                now = time.perf_counter()
+                if received == 0:
+                    result["firstMessage"].append(now - started)
+                else:
+                    result["interval"].append(now - last)
+                last = now
+                received += 1
+                result["messages"] += 1
+                result["bytes"] += len(message)
+    except Exception as e:
+        result["errors"].append(repr(e))
+
+
+async def run_ws(base: str, args, lines: list[str]) -> dict:
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(WS_ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"unknown endpoint(s): {','.join(sorted(unknown))}")
+
+    end = date.today()
+    start = end - timedelta(days=args.range_days - 1)
+    results = {}
+    tasks = []
+    for i in range(args.clients):
+        endpoint = endpoints[i % len(endpoints)]
+        line_id = lines[i % len(lines)]
+        result = results.setdefault(endpoint, {"messages": 0, "bytes": 0, "firstMessage": [],
+                                                "interval": [], "errors": []})
+        tasks.append(ws_client(ws_url(base, endpoint, line_id, start, end), args.duration, result))
+
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    return {"endpoints": {
+        endpoint: {
+            "clients": sum(1 for i in range(args.clients) if endpoints[i % len(endpoints)] == endpoint),
+            "messages": r["messages"],
+            "messagesPerSec": round(r["messages"] / elapsed, 2),
+            "megabytes": round(r["bytes"] / 1024 / 1024, 2),
+            "firstMessage": latency_summary(r["firstMessage"]),
+            "interval": latency_summary(r["interval"]),
+            "errors": len(r["errors"]),
+            "sampleError": r["errors"][0] if r["errors"] else None,
+        }
+        for endpoint, r in results.items()
+    }}
+
+
+async def run_http(base: str, args) -> dict:
+    import httpx
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(args.http_requests):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.get(f"{base}/calibration/")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(args.http_concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.http_requests,
+        "concurrency": args.http_concurrency,
+        "requestsPerSec": round(len(latencies) / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "errors": errors,
+    }
+
+
+def print_report(report: dict):
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app, engine, db_counter = prepare_app(args)
+    lines = [f"BMA{i:02d}" for i in range(1, args.lines + 1)]
+
+    report = {"config": {k: v for k, v in vars(args).items() if k != "db_url"}, "dialect": engine.dialect.name}
+
+    if not args.no_seed:
+        from db.seed import seed_database
+        started = time.perf_counter()
+        report["seed"] = seed_database(engine, lines, args.days, args.rows_per_day, args.seed)
+        report["seed"]["seconds"] = round(time.perf_counter() - started, 2)
+        print(f"seeded {report['seed']}", file=sys.stderr)
+
+    port = free_port()
+    server, thread = start_server(app, port)
+    memory_before = memory_mb()
+    try:
+        for name, scenario in (
+                ("websocket", lambda: run_ws(f"ws://127.0.0.1:{port}", args, lines)),
+                ("http", lambda: run_http(f"http://127.0.0.1:{port}", args))):
+            if (name == "websocket" and args.clients <= 0) or (name == "http" and args.http_requests <= 0):
+                continue
+            queries_before = db_counter["queries"]
+            started = time.perf_counter()
+            report[name] = asyncio.run(scenario())
+            elapsed = time.perf_counter() - started
+            report[name]["dbQueries"] = db_counter["queries"] - queries_before
+            report[name]["dbQueriesPerSec"] = round(report[name]["dbQueries"] / elapsed, 2)
+            print(f"finished {name} scenario in {elapsed:.1f}s", file=sys.stderr)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    report["memory"] = {"rssBeforeMb": memory_before, "rssAfterMb": memory_mb()}
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+if __name__ == "__main__":
+    main()
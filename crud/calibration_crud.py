@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from models.calibration_model import APEBMCalibration, APEBMCalibrationHistory
 from schemas.calibration_schema import CalibrationCreate, CalibrationUpdate
 from datetime import datetime
+from utils.metrics import timed_query
 
 def log_history(db: Session, cal: APEBMCalibration, action: str, user="Web User"):
     # หาเวอร์ชันล่าสุดจาก History ของ Seriesnumber เดียวกัน
@@ -76,9 +77,11 @@ def delete_calibration(db: Session, cal_id: int, user="Web User"):
     db.commit()
     return cal
 
+@timed_query
 def list_calibrations(db: Session):
     return db.query(APEBMCalibration).filter(APEBMCalibration.IsDeleted == False).all()
 
+@timed_query
 def get_calibration_history(db: Session, seriesnumber: str):
     return db.query(APEBMCalibrationHistory).filter(
         APEBMCalibrationHistory.Seriesnumber == seriesnumber
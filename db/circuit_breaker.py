@@ -0,0 +1,79 @@
+"""
+circuit breaker ของ DB: fail ติดกันถึง threshold = เปิดวงจร ไม่ยิง DB (ไม่ต้องรอ connection จาก pool)
+จน reset_timeout ผ่านไป แล้วปล่อยให้ลองทีละ 1 ครั้ง (half-open) สำเร็จ = ปิดวงจร fail = เปิดต่อ
+
+ระหว่างเปิด feed ส่งข้อมูลล่าสุดที่มีพร้อม flag stale แทน (utils/subscription_hub.py)
+"""
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from db.config import DB_BREAKER_FAILURES, DB_BREAKER_RESET_SEC
+from db.query_guard import QueryCancelled, query_cancelled
+
+# error ที่แปลว่า DB / network มีปัญหา (timeout, connection หลุด, pool เต็ม) ไม่ใช่ SQL ผิด
+DB_FAILURES = (OperationalError, InterfaceError, PoolTimeoutError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit open")
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    raise CircuitOpenError(f"{self.name} circuit half-open")
+                self._trial_running = True
+
+    def _record(self, failed: bool | None):
+        with self._lock:
+            self._trial_running = False
+            if failed is None:
+                # ไม่รู้ผล (ถูกยกเลิก) ไม่เปลี่ยนสถานะ
+                return
+            if not failed:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self):
+        self._before_call()
+        try:
+            yield
+        except BaseException as e:
+            # query ที่ถูกยกเลิกเพราะไม่มีคนรอ ไม่นับว่า DB มีปัญหา / ไม่ถือว่า DB กลับมาแล้ว
+            if isinstance(e, QueryCancelled) or query_cancelled():
+                self._record(failed=None)
+            else:
+                self._record(failed=isinstance(e, DB_FAILURES))
+            raise
+        else:
+            self._record(failed=False)
+
+
+read_breaker = CircuitBreaker("read", DB_BREAKER_FAILURES, DB_BREAKER_RESET_SEC)
@@ -3,15 +3,77 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-DB_URL = (
-    f"mssql+pyodbc://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
-    f"{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}?"
-    f"driver={os.getenv('DB_DRIVER').replace(' ', '+')}"
-)
+# BACKEND=embedded: รันในเครื่อง / CI โดยไม่ต้องมี SQL Server และ Redis
+# ใช้ SQLite ไฟล์เดียว (seed ข้อมูลสังเคราะห์ + JSON calibration ตอนใช้ครั้งแรก) และ Redis ใน memory
+BACKEND = os.getenv('BACKEND', 'mssql').lower()
+EMBEDDED = BACKEND == 'embedded'
+EMBEDDED_DB_PATH = os.getenv('EMBEDDED_DB_PATH', '.local/dashboard.db')
+EMBEDDED_SEED_LINES = [line.strip() for line in os.getenv('EMBEDDED_SEED_LINES', 'BMA01,BMA02,BMA03').split(',') if line.strip()]
+EMBEDDED_SEED_DAYS = int(os.getenv('EMBEDDED_SEED_DAYS', 30))
+EMBEDDED_SEED_ROWS_PER_DAY = int(os.getenv('EMBEDDED_SEED_ROWS_PER_DAY', 500))
+
+# DATABASE_URL ใช้ override ทั้งก้อน (เช่น benchmark ที่ชี้ไป DB ในเครื่อง)
+if EMBEDDED:
+    DB_URL = os.getenv('DATABASE_URL') or f"sqlite:///{EMBEDDED_DB_PATH}"
+else:
+    DB_URL = os.getenv('DATABASE_URL') or (
+        f"mssql+pyodbc://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
+        f"{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}?"
+        f"driver={os.getenv('DB_DRIVER', '').replace(' ', '+')}"
+    )
+
+# query อ่านอย่างเดียว (dashboard / รายการ calibration) ใช้ pool แยก ชี้ไป read replica ได้
+# ไม่ตั้ง DATABASE_READ_URL = ใช้ server เดียวกันแต่คนละ pool
+DB_READ_URL = os.getenv('DATABASE_READ_URL') or DB_URL
+# READ UNCOMMITTED = ไม่รอ lock ของ calibration ที่กำลังเขียน, SNAPSHOT ต้องเปิด ALLOW_SNAPSHOT_ISOLATION ที่ DB ก่อน
+DB_READ_ISOLATION = os.getenv('DB_READ_ISOLATION', 'READ UNCOMMITTED').upper() or None
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 10))
+DB_READ_MAX_OVERFLOW = int(os.getenv('DB_READ_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT_SEC = float(os.getenv('DB_POOL_TIMEOUT_SEC', 30))
+# connection ที่เปิดรอไว้ตอน startup (lifespan) และ timeout ของการเช็คใน /ready
+DB_POOL_WARMUP = int(os.getenv('DB_POOL_WARMUP', 1))
+DB_READ_POOL_WARMUP = int(os.getenv('DB_READ_POOL_WARMUP', 2))
+READY_TIMEOUT_SEC = float(os.getenv('READY_TIMEOUT_SEC', 3))
+# timeout ต่อ statement ของ read pool (0 = ไม่จำกัด) และ circuit breaker ของ query ฝั่งอ่าน
+DB_QUERY_TIMEOUT_SEC = float(os.getenv('DB_QUERY_TIMEOUT_SEC', 30))
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', 5))
+DB_BREAKER_RESET_SEC = float(os.getenv('DB_BREAKER_RESET_SEC', 30))
 
 API_TITLE = os.getenv('API_TITLE')
 API_DESCRIPTION = os.getenv('API_DESCRIPTION')
 API_VERSION = os.getenv('API_VERSION')
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', '').split(',')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Slow query profiler
+SLOW_QUERY_KEEP = int(os.getenv('SLOW_QUERY_KEEP', 20))
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 1000))
+SLOW_QUERY_CAPTURE_PLAN = os.getenv('SLOW_QUERY_CAPTURE_PLAN', 'false').lower() == 'true'
+# /debug/slow-queries คืน SQL พร้อมค่า parameter จริง (และลบได้) เปิดเฉพาะตอน debug เท่านั้น
+DEBUG_ENDPOINTS = os.getenv('DEBUG_ENDPOINTS', 'false').lower() == 'true'
+
+
 
+# WebSocket feed หลาย worker: worker เดียวต่อ key ที่ยิง DB (lease ใน Redis) ที่เหลือ relay ผ่าน pub/sub
+# owner ต่ออายุทุก ttl/3 รวมถึงระหว่าง query (utils/subscription_hub.py) ttl จึงไม่ต้องนานกว่า query ที่ช้าที่สุด
+FEED_COORDINATION = os.getenv('FEED_COORDINATION', 'true').lower() == 'true'
+FEED_LEASE_TTL_SEC = float(os.getenv('FEED_LEASE_TTL_SEC', 30))
+# ข้อมูลล่าสุดของ feed เก็บไว้นานพอจะใช้เป็นข้อมูล stale ระหว่าง DB ล่ม
+FEED_LAST_TTL_SEC = int(os.getenv('FEED_LAST_TTL_SEC', 24 * 3600))
 
+# snapshot (Parquet แยก line / เดือน) ของวันทำงานที่ปิดแล้ว: summary / pareto ช่วงยาวอ่านจากไฟล์ มีแค่วันนี้ที่ยิง DB
+# ต้องติดตั้ง pyarrow ไม่มี = ปิดเอง ทุก query กลับไปยิง DB เหมือนเดิม
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '.local/snapshots')
+SNAPSHOT_BACKFILL_DAYS = int(os.getenv('SNAPSHOT_BACKFILL_DAYS', 180))
+# รอหลังปิดวันก่อน export (ข้อมูลที่ upload ช้า) และรอบการเช็ควันที่ยังไม่ export
+SNAPSHOT_SETTLE_MINUTES = int(os.getenv('SNAPSHOT_SETTLE_MINUTES', 60))
+SNAPSHOT_EXPORT_INTERVAL_SEC = float(os.getenv('SNAPSHOT_EXPORT_INTERVAL_SEC', 600))
+SNAPSHOT_EXPORT_BATCH_DAYS = int(os.getenv('SNAPSHOT_EXPORT_BATCH_DAYS', 7))
+# วันที่ export แล้วย้อนหลังกี่วันที่เทียบจำนวน fail กับ DB ทุกรอบ ไม่ตรง (แถวมาช้าหลัง settle) = export วันนั้นใหม่
+SNAPSHOT_RECHECK_DAYS = int(os.getenv('SNAPSHOT_RECHECK_DAYS', 7))
+# export ใช้ engine / pool ของตัวเอง (ไม่แย่ง read pool, ไม่ผ่าน circuit breaker ของ dashboard)
+# timeout ต่อ statement ยาวกว่า dashboard ได้เพราะไม่มีคนรอหน้าจอ
+SNAPSHOT_QUERY_TIMEOUT_SEC = float(os.getenv('SNAPSHOT_QUERY_TIMEOUT_SEC', 300))
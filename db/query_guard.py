@@ -0,0 +1,100 @@
+"""
+กัน query ค้าง: timeout ต่อ statement และยกเลิก query ที่กำลังรันเมื่อไม่มีใครรอผลแล้ว
+
+- install_statement_timeout(): ตั้ง timeout ของ pyodbc ทุก connection ใน pool (เกินแล้ว driver ยกเลิกเอง)
+- CancelScope: feed ที่ถูกยกเลิก (subscriber คนสุดท้ายออก) เรียก scope.cancel()
+  จาก event loop เพื่อยกเลิก statement ที่ thread ของมันกำลังรันอยู่ (SQLCancel / sqlite interrupt)
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class CancelScope:
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._canceller = None  # ยกเลิก statement ที่กำลังรันอยู่ (ถ้ามี)
+
+    def attach(self, canceller):
+        with self._lock:
+            self._canceller = canceller
+            if self.cancelled:
+                raise QueryCancelled()
+
+    def detach(self):
+        with self._lock:
+            self._canceller = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            canceller = self._canceller
+        if canceller is not None:
+            try:
+                canceller()
+            except Exception:
+                # statement อาจจบไปแล้วระหว่างนั้น
+                pass
+
+
+_current_scope: ContextVar[CancelScope | None] = ContextVar("current_cancel_scope", default=None)
+
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def query_cancelled() -> bool:
+    scope = _current_scope.get()
+    return scope is not None and scope.cancelled
+
+
+def run_cancellable(scope: CancelScope, func, *args):
+    """
+    ใช้กับ asyncio.to_thread: query ทุกตัวที่ func ยิงใน thread นี้ยกเลิกได้ผ่าน scope
+    """
+    with cancel_scope(scope):
+        return func(*args)
+
+
+def install_statement_timeout(engine: Engine, seconds: float):
+    @event.listens_for(engine, "connect")
+    def set_timeout(dbapi_connection, connection_record):
+        # pyodbc: timeout (วินาที) ของทุก statement บน connection นี้ 0 = ไม่จำกัด
+        if seconds and hasattr(dbapi_connection, "timeout"):
+            dbapi_connection.timeout = int(seconds)
+
+
+def install_query_cancellation(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        scope = _current_scope.get()
+        if scope is None:
+            return
+        # pyodbc มี cursor.cancel(), sqlite3 (benchmark / dev) ใช้ connection.interrupt()
+        canceller = getattr(cursor, "cancel", None) or getattr(conn.connection.dbapi_connection, "interrupt", None)
+        scope.attach(canceller)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.detach()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.detach()
@@ -0,0 +1,144 @@
+"""
+เก็บสถิติ query ที่ช้าที่สุด N อันดับ ผ่าน SQLAlchemy cursor events
+ดูได้ที่ GET /debug/slow-queries
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from db.config import SLOW_QUERY_KEEP, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_CAPTURE_PLAN
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT_CHARS = 4000
+MAX_PARAM_CHARS = 200
+
+_lock = threading.Lock()
+_slowest = []  # min-heap ของ (durationMs, seq, record) ขนาดไม่เกิน SLOW_QUERY_KEEP
+_seq = itertools.count()
+_plans = {}    # statement -> plan XML (จับครั้งเดียวต่อ statement)
+_plan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="showplan")
+
+# service function ที่กำลังรัน query อยู่ และ record ของ statement ที่มันยิง
+_current_function: ContextVar[str | None] = ContextVar("current_query_function", default=None)
+_current_records: ContextVar[list | None] = ContextVar("current_query_records", default=None)
+
+
+def _short(value) -> str:
+    text = repr(value)
+    return text if len(text) <= MAX_PARAM_CHARS else text[:MAX_PARAM_CHARS] + "..."
+
+
+def _format_params(parameters):
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {k: _short(v) for k, v in parameters.items()}
+    return [_short(v) for v in parameters]
+
+
+@contextmanager
+def query_context(function: str):
+    """
+    ผูก statement ที่ยิงภายใน block กับชื่อ service function
+    แล้วให้ผู้เรียกเติมจำนวนแถว (cursor.rowcount ของ SELECT บน pyodbc เป็น -1)
+    """
+    records = []
+    fn_token = _current_function.set(function)
+    rec_token = _current_records.set(records)
+    try:
+        yield records
+    finally:
+        _current_function.reset(fn_token)
+        _current_records.reset(rec_token)
+
+
+def set_row_count(records: list, rows: int):
+    if records and records[-1]["rowCount"] is None:
+        records[-1]["rowCount"] = rows
+
+
+def _remember(record: dict):
+    with _lock:
+        item = (record["durationMs"], next(_seq), record)
+        if len(_slowest) < SLOW_QUERY_KEEP:
+            heapq.heappush(_slowest, item)
+        elif item[0] > _slowest[0][0]:
+            heapq.heapreplace(_slowest, item)
+
+
+def slowest_queries():
+    with _lock:
+        items = sorted(_slowest, key=lambda item: item[0], reverse=True)
+    return [
+        {**record, "plan": _plans.get(record["statement"])}
+        for _, _, record in items
+    ]
+
+
+def reset_slowest():
+    with _lock:
+        _slowest.clear()
+        _plans.clear()
+
+
+def _capture_plan(engine: Engine, key: str, statement: str, parameters):
+    """
+    ขอ estimated plan จาก SQL Server (SHOWPLAN_XML ไม่ได้รัน query จริง)
+    ใช้ raw DBAPI connection จึงไม่วนกลับเข้า event ของตัวเอง
+    """
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            cursor.execute(statement, parameters or ())
+            row = cursor.fetchone()
+            with _lock:
+                _plans[key] = row[0] if row else None
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+            cursor.close()
+    except Exception:
+        logger.warning("showplan capture failed", exc_info=True)
+    finally:
+        raw.close()
+
+
+def install_query_profiler(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        rowcount = getattr(cursor, "rowcount", -1)
+        record = {
+            "function": _current_function.get(),
+            "statement": statement[:MAX_STATEMENT_CHARS],
+            "parameters": _format_params(parameters),
+            "durationMs": round(duration_ms, 2),
+            "rowCount": rowcount if rowcount is not None and rowcount >= 0 else None,
+            "executedAt": datetime.now().isoformat(timespec="seconds"),
+        }
+        records = _current_records.get()
+        if records is not None:
+            records.append(record)
+        _remember(record)
+
+        if duration_ms >= SLOW_QUERY_THRESHOLD_MS:
+            logger.warning("slow query %.0f ms function=%s params=%s",
+                           duration_ms, record["function"], record["parameters"])
+            if (SLOW_QUERY_CAPTURE_PLAN and engine.dialect.name == "mssql"
+                    and not executemany and record["statement"] not in _plans):
+                with _lock:
+                    _plans[record["statement"]] = None  # กันจับซ้ำระหว่างรอ
+                _plan_executor.submit(_capture_plan, engine, record["statement"], statement, parameters)
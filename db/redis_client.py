@@ -1,6 +1,7 @@
 import redis
 import os
 from dotenv import load_dotenv
+from db.config import EMBEDDED
 
 load_dotenv()
 
@@ -8,10 +9,33 @@ REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 
-r = redis.Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=REDIS_DB,
-    decode_responses=True
-)
+# memory = Redis ใน process (fakeredis) ใช้กับ BACKEND=embedded / benchmark
+# ข้อมูลไม่ข้าม worker / restart จึงใช้ได้แค่ uvicorn worker เดียว
+REDIS_BACKEND = os.getenv("REDIS_BACKEND", "memory" if EMBEDDED else "redis").lower()
+
+
+def _create_memory_client():
+    try:
+        import fakeredis
+    except ImportError:
+        raise RuntimeError("REDIS_BACKEND=memory ต้องติดตั้ง fakeredis ก่อน (pip install fakeredis)") from None
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+if REDIS_BACKEND == "memory":
+    r = _create_memory_client()
+else:
+    # redis-py ไม่ต่อจริงจนกว่าจะมีคำสั่งแรก (connection pool เปิดแบบ lazy)
+    # lifespan ของ main.py เรียก check_redis() เพื่อเปิด connection แรกไว้ก่อน
+    r = redis.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        decode_responses=True
+    )
+
+
+def check_redis():
+    # อ้าง r ผ่าน module เพื่อให้ตัวที่ถูกแทน (เช่น fakeredis ใน benchmark) ถูกเช็คด้วย
+    r.ping()
 4
\ No newline at end of file
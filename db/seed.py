@@ -0,0 +1,175 @@
+"""
+สร้างข้อมูลจำลองสำหรับ benchmark และ BACKEND=embedded (DB ในเครื่อง ไม่ต้องมี SQL Server)
+
+- APBM_FailuresPareto: fail สังเคราะห์ตามจำนวน line / วัน / แถวต่อวันที่กำหนด (seed คงที่ = ทำซ้ำได้)
+- APBMCalibrationtools / APEBMCalibrationHistory: โหลดจากไฟล์ JSON ใน root ของ repo
+"""
+import json
+import logging
+import random
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from sqlalchemy import (Column, DateTime, Index, Integer, MetaData, String, Table,
+                        delete, exists, inspect, insert, select)
+from sqlalchemy.engine import Engine
+from models.calibration_model import APEBMCalibration, APEBMCalibrationHistory
+from db.session import Base
+from utils.failure_helpers import WORKDAY_OFFSET_MINUTES
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+CALIBRATION_JSON = ROOT / "APBMCalibrationtools.json"
+HISTORY_JSON = ROOT / "APEBMCalibrationHistory.json"
+
+INSERT_BATCH = 5_000
+
+metadata = MetaData()
+
+# โครงสร้างเดียวกับ models/failure_model.py (ที่ comment ไว้)
+failures_table = Table(
+    "APBM_FailuresPareto", metadata,
+    Column("ID", Integer, primary_key=True, autoincrement=True),
+    Column("LineID", String(15)),
+    Column("FGpartnumber", String(50), nullable=False),
+    Column("Station", String(50), nullable=False),
+    Column("Trackingnumber", String(50), nullable=False),
+    Column("Operator", String(50)),
+    Column("DateTime", DateTime),
+    Column("FailItem", String(400)),
+    Column("TesterID", String(50), nullable=False),
+    Column("FixtureID", String(50)),
+    Column("WorkOrder", String(50), nullable=False),
+    Column("TestProgramName", String(200)),
+    Index("IX_APBM_FailuresPareto_LineID_DateTime", "LineID", "DateTime"),
+)
+
+# ชื่อ station ที่ตรงกับ LIKE pattern ใน services/failure_filter_service.py
+# น้ำหนักทำให้บาง station fail บ่อยกว่า (คล้ายของจริง)
+STATIONS = [
+    ("VFLASH", 6), ("HIPOT_1", 8), ("ATS1", 20), ("HEATUP", 5), ("VIBRATION", 3),
+    ("BURN_IN", 10), ("HIPOT_2", 8), ("ATS2", 18), ("VFLASH2", 4), ("ATS3", 12),
+]
+MODELS = ["FG-1000", "FG-1200", "FG-2000", "FG-2400", "FG-3000"]
+FAIL_ITEMS = [
+    "Output_Voltage_12V", "Output_Voltage_5V", "Ripple_Noise", "Efficiency_Full_Load",
+    "Inrush_Current", "Leakage_Current", "Insulation_Resistance", "Fan_Speed",
+    "OCP_Trip_Point", "OVP_Trip_Point", "Power_Factor", "Hold_Up_Time",
+    "Standby_Power", "Temperature_Rise", "Dielectric_Withstand", "Ground_Bond",
+]
+
+
+def generate_failures(lines: list[str], days: int, rows_per_day: int,
+                      end_date: date | None = None, seed: int = 42):
+    """
+    yield แถว fail สังเคราะห์ ย้อนหลัง `days` วันทำงานถึง end_date
+    fail item / tester / fixture กระจายแบบ Pareto (ไม่กี่ตัวกินส่วนใหญ่)
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    station_names = [name for name, _ in STATIONS]
+    station_weights = [weight for _, weight in STATIONS]
+    item_weights = [1 / (i + 1) ** 1.2 for i in range(len(FAIL_ITEMS))]
+    testers = [f"T{i:02d}" for i in range(1, 41)]
+    tester_weights = [1 / (i + 1) for i in range(len(testers))]
+    fixtures = [f"FX{i:03d}" for i in range(1, 121)]
+    fixture_weights = [1 / (i + 1) ** 0.8 for i in range(len(fixtures))]
+    serial = 0
+
+    for line_id in lines:
+        for day_index in range(days):
+            work_date = end_date - timedelta(days=days - 1 - day_index)
+            day_start = datetime.combine(work_date, datetime.min.time()) + timedelta(minutes=WORKDAY_OFFSET_MINUTES)
+            # วันหนึ่งมีขึ้นลงได้ ±30%
+            count = max(1, int(rows_per_day * rng.uniform(0.7, 1.3)))
+            for _ in range(count):
+                serial += 1
+                station = rng.choices(station_names, station_weights)[0]
+                item = rng.choices(FAIL_ITEMS, item_weights)[0]
+                yield {
+                    "LineID": line_id,
+                    "FGpartnumber": rng.choice(MODELS),
+                    "Station": station,
+                    "Trackingnumber": f"SN{serial:010d}",
+                    "Operator": f"OP{rng.randint(1, 60):03d}",
+                    "DateTime": day_start + timedelta(seconds=rng.randrange(24 * 3600)),
+                    "FailItem": f"{{{rng.randint(1, 99)}({station}){item}}}",
+                    "TesterID": f"{station}-{rng.choices(testers, tester_weights)[0]}",
+                    "FixtureID": rng.choices(fixtures, fixture_weights)[0],
+                    "WorkOrder": f"WO{work_date:%y%m}{rng.randint(1, 50):03d}",
+                    "TestProgramName": f"{station}_PROGRAM_V{rng.randint(1, 3)}",
+                }
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+
+
+def _load_json_rows(path: Path, model, skip: tuple[str, ...]):
+    columns = {c.name: c for c in model.__table__.columns}
+    rows = []
+    for raw in json.loads(path.read_text(encoding="utf-8")):
+        row = {}
+        for key, value in raw.items():
+            if key in skip or key not in columns:
+                continue
+            if isinstance(columns[key].type, DateTime):
+                value = _parse_datetime(value)
+            elif isinstance(value, str):
+                value = value.strip()
+            row[key] = value
+        rows.append(row)
+    return rows
+
+
+def _insert_batches(conn, table, rows):
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            conn.execute(insert(table), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+        total += len(batch)
+    return total
+
+
+def seed_database(engine: Engine, lines: list[str], days: int, rows_per_day: int, seed: int = 42):
+    """
+    สร้างตาราง (ถ้ายังไม่มี) ล้างข้อมูลเดิม แล้วใส่ข้อมูลชุดใหม่ คืนค่าจำนวนแถวที่ใส่
+    """
+    calibration_tables = [APEBMCalibration.__table__, APEBMCalibrationHistory.__table__]
+    metadata.create_all(engine)
+    Base.metadata.create_all(engine, tables=calibration_tables)
+
+    with engine.begin() as conn:
+        conn.execute(delete(failures_table))
+        for table in calibration_tables:
+            conn.execute(delete(table))
+
+        failures = _insert_batches(conn, failures_table, generate_failures(lines, days, rows_per_day, seed=seed))
+        # ID เป็น IDENTITY บน SQL Server จึงให้ DB สร้างเอง
+        calibrations = _insert_batches(conn, APEBMCalibration.__table__,
+                                       _load_json_rows(CALIBRATION_JSON, APEBMCalibration, ("ID",)))
+        history = _insert_batches(conn, APEBMCalibrationHistory.__table__,
+                                  _load_json_rows(HISTORY_JSON, APEBMCalibrationHistory, ("HistoryID",)))
+
+    return {"failures": failures, "calibrations": calibrations, "history": history}
+
+
+def ensure_seeded(engine: Engine, lines: list[str], days: int, rows_per_day: int, seed: int = 42):
+    """
+    seed เฉพาะตอน DB ยังว่าง (ครั้งแรก) restart ครั้งต่อไปใช้ข้อมูลเดิม ลบไฟล์ DB = ได้ชุดใหม่
+    """
+    if inspect(engine).has_table(failures_table.name):
+        with engine.connect() as conn:
+            if conn.execute(select(exists().select_from(failures_table))).scalar():
+                return None
+    counts = seed_database(engine, lines, days, rows_per_day, seed)
+    logger.info("seeded embedded database %s", counts)
+    return counts
@@ -1,9 +1,112 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from db.config import DB_URL
+"""
+engine สร้างตอนใช้ครั้งแรก (หรือตอน warm_up_pools() ใน lifespan ของ main.py) ไม่ใช่ตอน import
+import module นี้จึงไม่ต้องมี driver (pyodbc) / DB พร้อม เช่นตอน test หรือ worker respawn
+"""
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from db.config import (DB_URL, DB_READ_URL, DB_READ_ISOLATION, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                       DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW, DB_POOL_TIMEOUT_SEC, DB_QUERY_TIMEOUT_SEC,
+                       DB_POOL_WARMUP, DB_READ_POOL_WARMUP, EMBEDDED, EMBEDDED_SEED_LINES, EMBEDDED_SEED_DAYS,
+                       EMBEDDED_SEED_ROWS_PER_DAY, SNAPSHOT_QUERY_TIMEOUT_SEC)
+from db.query_guard import install_query_cancellation, install_statement_timeout
+from db.query_profiler import install_query_profiler
 
-engine = create_engine(DB_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_engines = {}
+
+
+def _create_primary_engine() -> Engine:
+    # primary: calibration CRUD (เขียน + อ่านหลังเขียน)
+    engine = create_engine(DB_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT_SEC, pool_pre_ping=True)
+    install_query_profiler(engine)
+    return engine
+
+
+def _create_read_engine() -> Engine:
+    # read: query หนักของ dashboard ใช้ pool ของตัวเอง ไม่แย่ง connection / lock กับงานเขียน
+    engine = create_engine(DB_READ_URL, pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT_SEC, pool_pre_ping=True,
+                           isolation_level=DB_READ_ISOLATION)
+    install_query_profiler(engine)
+    install_statement_timeout(engine, DB_QUERY_TIMEOUT_SEC)
+    install_query_cancellation(engine)
+    return engine
+
+
+def _create_export_engine() -> Engine:
+    # export snapshot (services/failure_snapshot_service.py): query ช่วงยาวทีละตัว connection เดียวพอ
+    # แยกจาก read pool = ไม่แย่ง connection และ timeout ของ dashboard
+    engine = create_engine(DB_READ_URL, pool_size=1, max_overflow=0,
+                           pool_timeout=DB_POOL_TIMEOUT_SEC, pool_pre_ping=True,
+                           isolation_level=DB_READ_ISOLATION)
+    install_query_profiler(engine)
+    install_statement_timeout(engine, SNAPSHOT_QUERY_TIMEOUT_SEC)
+    return engine
+
+
+_FACTORIES = {"primary": _create_primary_engine, "read": _create_read_engine, "export": _create_export_engine}
+
+
+def _prepare_embedded_database(engine: Engine):
+    # BACKEND=embedded: สร้างโฟลเดอร์ของไฟล์ SQLite และ seed ข้อมูลถ้ายังว่าง ก่อน engine แรกถูกใช้
+    database = engine.url.database
+    if engine.dialect.name == "sqlite" and database and database != ":memory:":
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+    from db.seed import ensure_seeded
+    ensure_seeded(engine, EMBEDDED_SEED_LINES, EMBEDDED_SEED_DAYS, EMBEDDED_SEED_ROWS_PER_DAY)
+
+
+def _get_engine(name: str) -> Engine:
+    engine = _engines.get(name)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(name)
+            if engine is None:
+                engine = _FACTORIES[name]()
+                if EMBEDDED and not _engines:
+                    _prepare_embedded_database(engine)
+                _engines[name] = engine
+    return engine
+
+
+def get_engine() -> Engine:
+    return _get_engine("primary")
+
+
+def get_read_engine() -> Engine:
+    return _get_engine("read")
+
+
+def get_export_engine() -> Engine:
+    return _get_engine("export")
+
+
+class _PrimarySession(Session):
+    def get_bind(self, mapper=None, **kwargs):
+        return get_engine()
+
+
+class _ReadSession(Session):
+    def get_bind(self, mapper=None, **kwargs):
+        return get_read_engine()
+
+
+class _ExportSession(Session):
+    def get_bind(self, mapper=None, **kwargs):
+        return get_export_engine()
+
+
+SessionLocal = sessionmaker(class_=_PrimarySession, autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(class_=_ReadSession, autocommit=False, autoflush=False)
+ExportSessionLocal = sessionmaker(class_=_ExportSession, autocommit=False, autoflush=False)
 Base = declarative_base()
 def get_db():
     db = SessionLocal()
@@ -11,3 +114,60 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _open_connections(engine: Engine, count: int):
+    # เปิดพร้อมกัน count ตัวแล้วคืนเข้า pool = request แรกไม่ต้องรอ handshake / login
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_up_pools() -> dict:
+    """
+    สร้าง engine และเปิด connection ขั้นต่ำของทั้งสอง pool แบบขนาน คืนค่าผลของแต่ละ pool
+    DB ยังไม่พร้อมไม่ทำให้แอปล้ม: แค่ log ไว้ แล้ว /ready จะตอบ 503 จนกว่าจะต่อได้
+    """
+    targets = {"primary": (get_engine, DB_POOL_WARMUP), "read": (get_read_engine, DB_READ_POOL_WARMUP)}
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="pool-warmup") as executor:
+        futures = {name: executor.submit(lambda f=factory, n=count: _open_connections(f(), n))
+                   for name, (factory, count) in targets.items()}
+        for name, future in futures.items():
+            try:
+                future.result()
+                results[name] = "ok"
+            except Exception as e:
+                logger.warning("%s pool warm-up failed: %r", name, e)
+                results[name] = repr(e)
+    return results
+
+
+def check_database():
+    """
+    ใช้กับ /ready: ขอ connection จาก read pool (ตัวที่ dashboard ใช้) แล้ว SELECT 1
+    """
+    with get_read_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def dispose_engines():
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
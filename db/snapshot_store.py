@@ -0,0 +1,152 @@
+"""
+ที่เก็บ snapshot แบบ columnar (Parquet) ของ APBM_FailuresPareto วันทำงานที่ปิดแล้ว
+
+    <SNAPSHOT_DIR>/failures/lineId=BMA01/month=2025-09/2025-09-05.parquet
+    <SNAPSHOT_DIR>/failures/_days/2025-09-05        (วันนั้น export ครบทุก line แล้ว เนื้อไฟล์ = จำนวน fail รวมของวัน)
+
+- หนึ่งไฟล์ต่อ line ต่อวัน เก็บจำนวน fail ที่ group แล้ว (workDate, workHour, stationKey, failItem, tester, fixture)
+  ไม่ใช่แถวดิบ: FailItem ถูกแยกและ Station ถูกจับคู่กับ STATION_KEYS ไว้แล้วตอน export
+- อ่านเฉพาะไฟล์ของ line / วันที่ขอ และเฉพาะ column ที่ใช้ (ไม่ต้อง scan ทั้ง dataset)
+- เขียนไฟล์ชั่วคราวแล้ว os.replace = ผู้อ่านไม่เห็นไฟล์ครึ่ง ๆ, export ซ้ำวันเดิมได้ผลเหมือนเดิม
+- โครงสร้างโฟลเดอร์แบบ hive (key=value) เปิดด้วย DuckDB / pyarrow.dataset ตรง ๆ ได้
+
+ไม่มี pyarrow (`pip install pyarrow`) = available เป็น False แล้ว router ยิง DB ตามเดิม
+"""
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from urllib.parse import quote, unquote
+from db.config import SNAPSHOT_DIR, SNAPSHOT_ENABLED
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MARKER_DIR = "_days"
+
+SCHEMA = pa.schema([
+    ("workDate", pa.date32()),
+    ("workHour", pa.int8()),
+    ("stationKey", pa.string()),
+    ("failItem", pa.string()),
+    ("testerId", pa.string()),
+    ("fixtureId", pa.string()),
+    ("failCount", pa.int32()),
+]) if pa is not None else None
+
+
+def day_range(start_date: date, end_date: date) -> list[date]:
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+class SnapshotStore:
+    def __init__(self, directory: str, enabled: bool = True):
+        self.root = Path(directory) / "failures"
+        self.enabled = enabled
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and pa is not None
+
+    def _line_dir(self, line_id: str) -> Path:
+        return self.root / f"lineId={quote(line_id, safe='')}"
+
+    def _day_path(self, line_id: str, work_date: date) -> Path:
+        return self._line_dir(line_id) / f"month={work_date:%Y-%m}" / f"{work_date.isoformat()}.parquet"
+
+    def exported_days(self) -> set[date]:
+        try:
+            names = os.listdir(self.root / MARKER_DIR)
+        except FileNotFoundError:
+            return set()
+        return {date.fromisoformat(name) for name in names if not name.startswith(".")}
+
+    def exported_counts(self, days: list[date]) -> dict[date, int | None]:
+        """
+        จำนวน fail รวมที่ export ไว้ของแต่ละวัน (ใช้เทียบกับ DB) marker แบบเก่าที่ไม่มีจำนวนได้ None
+        """
+        counts = {}
+        for day in days:
+            try:
+                counts[day] = int((self.root / MARKER_DIR / day.isoformat()).read_text())
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                counts[day] = None
+        return counts
+
+    def missing_days(self, start_date: date, end_date: date) -> list[date]:
+        exported = self.exported_days()
+        return [day for day in day_range(start_date, end_date) if day not in exported]
+
+    def covered_until(self, start_date: date, end_date: date) -> date | None:
+        """
+        วันสุดท้ายที่ snapshot มีครบต่อเนื่องตั้งแต่ start_date (None = ไม่มีวันแรก)
+        """
+        if not self.available:
+            return None
+        exported = self.exported_days()
+        covered = None
+        for day in day_range(start_date, end_date):
+            if day not in exported:
+                break
+            covered = day
+        return covered
+
+    def lines(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(unquote(path.name.split("=", 1)[1]) for path in self.root.glob("lineId=*"))
+
+    @staticmethod
+    def _write_atomic(path: Path, table):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        pq.write_table(table, temp, compression="zstd")
+        os.replace(temp, path)
+
+    def write_days(self, days: list[date], rows: list[dict]):
+        """
+        เขียนไฟล์ของทุก line ใน days แล้วค่อยวาง marker ของวัน (วันที่ไม่มี fail เลยก็ได้ marker)
+        export วันเดิมซ้ำได้: ไฟล์ของ line ที่ไม่มีแถวแล้วในรอบนี้ถูกลบทิ้ง
+        rows: ผลจาก fetch_snapshot_counts (มี lineId และ workDate เป็น date)
+        """
+        by_file = {}
+        totals = {day: 0 for day in days}
+        for row in rows:
+            by_file.setdefault((row["lineId"], row["workDate"]), []).append(row)
+            totals[row["workDate"]] = totals.get(row["workDate"], 0) + row["failCount"]
+
+        columns = SCHEMA.names
+        for (line_id, work_date), file_rows in by_file.items():
+            table = pa.Table.from_pylist([{c: r[c] for c in columns} for r in file_rows], schema=SCHEMA)
+            self._write_atomic(self._day_path(line_id, work_date), table)
+        for line_id in self.lines():
+            for day in days:
+                if (line_id, day) not in by_file:
+                    self._day_path(line_id, day).unlink(missing_ok=True)
+
+        markers = self.root / MARKER_DIR
+        markers.mkdir(parents=True, exist_ok=True)
+        for day in days:
+            (markers / day.isoformat()).write_text(str(totals[day]))
+        logger.info("snapshot exported days=%s..%s files=%d", min(days), max(days), len(by_file))
+
+    def read(self, line_id: str, start_date: date, end_date: date, columns: list[str]):
+        """
+        อ่านเฉพาะไฟล์ของ line / วันในช่วง และเฉพาะ columns ที่ขอ
+        """
+        paths = [str(path) for path in (self._day_path(line_id, day) for day in day_range(start_date, end_date))
+                 if path.exists()]
+        if not paths:
+            return SCHEMA.empty_table().select(columns)
+        return ds.dataset(paths, schema=SCHEMA, format="parquet").to_table(columns=columns)
+
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_ENABLED)
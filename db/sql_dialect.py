@@ -0,0 +1,52 @@
+"""
+ส่วนของ SQL ที่เขียนต่างกันแต่ละ DB (SQL Server จริง / SQLite ของ BACKEND=embedded และ benchmark)
+
+query ใน services/ เขียนเป็น template ที่มีช่องว่างแบบ {work_date} แล้วเรียก dialect_text()
+เพื่อเติมส่วนที่ตรงกับ DB ของ session นั้น ผลที่ได้ cache ไว้ต่อ (template, dialect)
+"""
+from functools import lru_cache
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+from utils.failure_helpers import WORKDAY_OFFSET_MINUTES
+
+_OFFSET = WORKDAY_OFFSET_MINUTES
+
+FRAGMENTS = {
+    "mssql": {
+        # วันทำงาน / ชั่วโมงของวันทำงาน (วันเริ่ม 07:40)
+        "work_date": f"CAST(DATEADD(MINUTE, -{_OFFSET}, DateTime) AS DATE)",
+        "work_hour": f"DATEPART(HOUR, DATEADD(MINUTE, -{_OFFSET}, DateTime))",
+        # ข้อความระหว่าง ')' กับ '}' ของ FailItem เช่น {12(ATS1)Output_Voltage_12V} -> Output_Voltage_12V
+        "fail_item": """CASE WHEN CHARINDEX(')', FailItem) > 0 AND CHARINDEX('}', FailItem) > 0
+                    THEN SUBSTRING(FailItem,CHARINDEX(')', FailItem) + 1,
+                    CHARINDEX('}', FailItem) - CHARINDEX(')', FailItem) - 1) ELSE NULL END""",
+        # yyyy-mm-dd hh:mi:ss
+        "date_time_text": "CONVERT(VARCHAR, DateTime, 120)",
+    },
+    "sqlite": {
+        "work_date": f"DATE(DateTime, '-{_OFFSET} minutes')",
+        "work_hour": f"CAST(STRFTIME('%H', DateTime, '-{_OFFSET} minutes') AS INTEGER)",
+        "fail_item": """CASE WHEN INSTR(FailItem, ')') > 0 AND INSTR(FailItem, '}') > 0
+                    THEN SUBSTR(FailItem, INSTR(FailItem, ')') + 1,
+                    INSTR(FailItem, '}') - INSTR(FailItem, ')') - 1) ELSE NULL END""",
+        "date_time_text": "STRFTIME('%Y-%m-%d %H:%M:%S', DateTime)",
+    },
+}
+
+
+@lru_cache(maxsize=None)
+def _render(template: str, dialect: str, extra: tuple) -> TextClause:
+    try:
+        fragments = FRAGMENTS[dialect]
+    except KeyError:
+        raise NotImplementedError(f"ยังไม่รองรับ dialect {dialect} (มี {', '.join(FRAGMENTS)})") from None
+    return text(template.format(**fragments, **dict(extra)))
+
+
+def dialect_text(db: Session, template: str, **extra: str) -> TextClause:
+    """
+    text() ของ template ที่เติม fragment ของ DB ที่ session นี้ต่ออยู่แล้ว
+    extra ใช้เติมส่วนอื่นที่เปลี่ยนตาม input (เช่นมี / ไม่มี filter LineID) ต้องไม่มีค่าจากผู้ใช้ตรง ๆ
+    """
+    return _render(template, db.get_bind().dialect.name, tuple(sorted(extra.items())))
@@ -1,6 +1,16 @@
 import { useEffect, useRef, useState } from "react";
 import type { FailureRow } from "../types/failure";
-import { buildWebSocketUrl, getRouteByPath } from "../config/routes";
+import { API_CONFIG } from "../config/routes";
+
+// ใช้ socket เดียว (/failures/ws) ตลอดอายุ component เปลี่ยน lineId / วันที่ = ส่ง update แทนการเปิด socket ใหม่
+const CHANNEL = "summary";
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
+
+type ServerMessage =
+    | { channel: string; type: "data"; data: FailureRow[]; stale?: boolean; refreshedAt?: string }
+    | { channel: string | null; type: "ack"; action: string }
+    | { channel: string | null; type: "error"; error: string };
 
 export function useFailuresWS({
                                   lineId,
@@ -16,51 +26,89 @@ export function useFailuresWS({
     const [data, setData] = useState<FailureRow[]>([]);
     const [connected, setConnected] = useState(false);
     const [error, setError] = useState<string | null>(null);
+    // DB มีปัญหา: server ส่งข้อมูลล่าสุดที่มีมาพร้อม stale=true
+    const [stale, setStale] = useState(false);
     const prevJSON = useRef<string>("[]");
+    const wsRef = useRef<WebSocket | null>(null);
+    const subscribed = useRef(false);
+    const params = { lineId, startDate: startDate || "", endDate: endDate || "" };
+    const paramsRef = useRef(params);
+    paramsRef.current = params;
 
 
     useEffect(() => {
-        // Use centralized WebSocket URL if base is not provided
-        const wsUrl = base || (() => {
-            const route = getRouteByPath('/');
-            return route ? buildWebSocketUrl(route, { lineId, startDate: startDate || '', endDate: endDate || '' }) : 'ws://localhost:8000/failures/ws/filter';
-        })();
-        
-        const ts = Date.now();
-        const url = new URL(wsUrl);
-        url.searchParams.set("lineId", lineId);
-        url.searchParams.set("_ts", String(ts));
-        if (startDate) url.searchParams.set("startDate", startDate);
-        if (endDate) url.searchParams.set("endDate", endDate);
-
-
-        const ws = new WebSocket(url.toString());
-        setConnected(false);
+        let disposed = false;
+        let attempt = 0;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
         setError(null);
 
+        const connect = () => {
+            const ws = new WebSocket(base || `${API_CONFIG.WS_BASE_URL}/failures/ws`);
+            wsRef.current = ws;
+            subscribed.current = false;
+            setConnected(false);
+
 
-        ws.onopen = () => setConnected(true);
-        ws.onerror = () => setError("WebSocket error");
-        ws.onclose = () => setConnected(false);
+            ws.onopen = () => {
+                attempt = 0;
+                setConnected(true);
+                setError(null);
+                // เปิดใหม่หลังหลุดก็ subscribe ด้วย params ล่าสุด (อาจเปลี่ยนไประหว่างหลุด)
+                ws.send(JSON.stringify({ action: "subscribe", channel: CHANNEL, type: "summary", params: paramsRef.current }));
+                subscribed.current = true;
+            };
+            ws.onerror = () => setError("WebSocket error");
+            // server restart / ถูกตัดเพราะ send_timeout, idle: ต่อใหม่เองแบบ backoff (1s, 2s, 4s ... สูงสุด 30s)
+            ws.onclose = () => {
+                setConnected(false);
+                subscribed.current = false;
+                if (disposed) return;
+                const delay = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** attempt) * (0.5 + Math.random() / 2);
+                attempt += 1;
+                retryTimer = setTimeout(connect, delay);
+            };
 
 
-        ws.onmessage = (evt) => {
-            try {
-                const next: FailureRow[] = JSON.parse(evt.data);
-                const nextJSON = JSON.stringify(next);
-                if (nextJSON !== prevJSON.current) {
-                    prevJSON.current = nextJSON;
-                    setData(next);
+            ws.onmessage = (evt) => {
+                try {
+                    const message: ServerMessage = JSON.parse(evt.data);
+                    if (message.type === "error") {
+                        setError(message.error);
+                        return;
+                    }
+                    if (message.type !== "data" || message.channel !== CHANNEL) return;
+                    setStale(Boolean(message.stale));
+                    const nextJSON = JSON.stringify(message.data);
+                    if (nextJSON !== prevJSON.current) {
+                        prevJSON.current = nextJSON;
+                        setData(message.data);
+                    }
+                } catch (e) {
+                    setError("Invalid data");
                 }
-            } catch (e) {
-                setError("Invalid data");
-            }
+            };
         };
 
+        connect();
 
-        return () => ws.close();
-    }, [lineId, startDate, endDate, base]);
+
+        return () => {
+            disposed = true;
+            clearTimeout(retryTimer);
+            wsRef.current?.close();
+            wsRef.current = null;
+        };
+    }, [base]);
+
+
+    useEffect(() => {
+        const ws = wsRef.current;
+        // ก่อน onopen / ระหว่างรอต่อใหม่ยังไม่ต้องส่ง: onopen จะ subscribe ด้วย params ล่าสุดให้เอง
+        if (!ws || ws.readyState !== WebSocket.OPEN || !subscribed.current) return;
+        setError(null);
+        ws.send(JSON.stringify({ action: "update", channel: CHANNEL, params: paramsRef.current }));
+    }, [lineId, startDate, endDate]);
 
 
-    return { data, connected, error };
-}
\ No newline at end of file
+    return { data, connected, error, stale };
+}
@@ -1,15 +1,69 @@
 # main.py
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import RedirectResponse, FileResponse, JSONResponse, PlainTextResponse
 from routers import all_routers
-from db.config import API_TITLE, API_DESCRIPTION, API_VERSION, ALLOWED_ORIGINS
+from db.circuit_breaker import CircuitOpenError
+from db.config import (API_TITLE, API_DESCRIPTION, API_VERSION, ALLOWED_ORIGINS, LOG_LEVEL, DB_BREAKER_RESET_SEC,
+                       READY_TIMEOUT_SEC)
+from db.redis_client import check_redis
+from db.session import check_database, dispose_engines, warm_up_pools
+from services.failure_snapshot_service import run_snapshot_exporter
+from utils.metrics import render_metrics, monitor_event_loop_lag
+from utils.static_assets import PrecompressedStaticFiles
+
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# ให้แน่ใจว่าโฟลเดอร์ templates/ อยู่ใน working directory เดียวกับที่รันแอป
+web_assets = PrecompressedStaticFiles(directory="templates", html=True)
+
+
+async def warm_up():
+    # DB / Redis ยังไม่พร้อมไม่ทำให้ startup ล้ม: /ready ตอบ 503 จนกว่าจะพร้อม
+    pools, redis_status, _ = await asyncio.gather(
+        asyncio.to_thread(warm_up_pools),
+        _check(check_redis),
+        asyncio.to_thread(web_assets.load),
+    )
+    logger.info("warm-up pools=%s redis=%s", pools, redis_status)
+
+
+async def _check(probe) -> str:
+    try:
+        await asyncio.wait_for(asyncio.to_thread(probe), READY_TIMEOUT_SEC)
+        return "ok"
+    except asyncio.TimeoutError:
+        return "timeout"
+    except Exception as e:
+        return repr(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # warm-up ทำเบื้องหลัง: รับ connection ได้ทันที (liveness "/") ส่วน readiness รอ /ready
+    warm_up_task = asyncio.create_task(warm_up())
+    # export วันที่ปิดแล้วลง snapshot (Parquet) ให้ query ช่วงยาวไม่ต้องยิง DB
+    snapshot_task = asyncio.create_task(run_snapshot_exporter())
+    yield
+    snapshot_task.cancel()
+    warm_up_task.cancel()
+    lag_task.cancel()
+    await asyncio.to_thread(dispose_engines)
+
 
 app = FastAPI(
     title=API_TITLE,
     description=API_DESCRIPTION,
     version=API_VERSION,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -20,22 +74,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# DB ล่ม (circuit breaker เปิด): ตอบ 503 ทันทีแทนการรอ connection / timeout
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database temporarily unavailable"},
+        headers={"Retry-After": str(int(DB_BREAKER_RESET_SEC))},
+    )
+
 # รวม API routers
 for router in all_routers:
     app.include_router(router)
 
-# Health check
+# Health check (liveness: process ยังตอบได้ ไม่แตะ DB / Redis)
 @app.get("/", tags=["Health"])
 def root():
     return {"message": "API is running!"}
 
+# Readiness: ให้ load balancer / rolling restart ส่ง traffic มาเมื่อ DB และ Redis ต่อได้แล้ว
+@app.get("/ready", tags=["Health"])
+async def ready():
+    database, redis_status = await asyncio.gather(_check(check_database), _check(check_redis))
+    checks = {"database": database, "redis": redis_status}
+    is_ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ready" if is_ready else "unavailable", "checks": checks},
+    )
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # ---------- สำคัญ: เสิร์ฟไฟล์สแตติก/หน้าเว็บ ----------
-# ให้แน่ใจว่าโฟลเดอร์ templates/ อยู่ใน working directory เดียวกับที่รันแอป
-# และไฟล์ชื่อ "calibration_pro.html" (สะกดให้ตรงเป๊ะ)
-app.mount("/templates", StaticFiles(directory="templates", html=True), name="templates")
+# ไฟล์ชื่อ "calibration_pro.html" (สะกดให้ตรงเป๊ะ)
+# /web/* map ไปที่ templates/ (mount เดียว = browser cache ไฟล์ชุดเดียว ไม่ใช่สอง URL)
+# บีบอัดไว้ล่วงหน้า + ETag + Cache-Control ดู utils/static_assets.py
+app.mount("/web", web_assets, name="web")
 
-# ทางเลือกที่คุ้นเคย: /web/* map ไปที่ templates/
-app.mount("/web", StaticFiles(directory="templates", html=True), name="web")
+# URL เดิม /templates และ /templates/* ย้ายถาวรไป /web/* (คง query string ของ bookmark เดิมไว้)
+@app.get("/templates", include_in_schema=False)
+@app.get("/templates/{path:path}", include_in_schema=False)
+def templates_redirect(request: Request, path: str = ""):
+    query = f"?{request.url.query}" if request.url.query else ""
+    return RedirectResponse(url=f"/web/{path}{query}", status_code=308)
 
 # ทางลัดเปิดหน้าเลย
 @app.get("/calibration_pro", include_in_schema=False)
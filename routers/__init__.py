@@ -3,10 +3,21 @@ from .failure_filter_router import  router as failure_filter_router
 from .failure_station_router import router as failure_station_router
 from  .failure_tester_router import router as failure_tester_router
 from .calibration_router import  router as calibration_router
+from .failure_pareto_router import router as failure_pareto_router
+from .failure_alert_router import router as failure_alert_router
+from .failure_ws_router import router as failure_ws_router
+from db.config import DEBUG_ENDPOINTS
 all_routers = [
     failure_fixture_router,
     failure_filter_router,
     failure_station_router,
     failure_tester_router,
-    calibration_router
+    calibration_router,
+    failure_pareto_router,
+    failure_alert_router,
+    failure_ws_router
 ]
+
+if DEBUG_ENDPOINTS:
+    from .debug_router import router as debug_router
+    all_routers.append(debug_router)
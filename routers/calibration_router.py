@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
 from typing import List
-from db.session import get_db
+from db.session import get_db, get_read_db
 from schemas.calibration_schema import CalibrationCreate, CalibrationUpdate, CalibrationResponse, CalibrationHistoryResponse
 from crud.calibration_crud import create_calibration, get_calibration, update_calibration, delete_calibration, \
     list_calibrations, get_calibration_history
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/calibration", tags=["Calibration"])
 SECRET_PASS = os.getenv('PW_CALIBRATION')
 
 @router.get("/", response_model=List[CalibrationResponse])
-def list_all(db: Session = Depends(get_db), q: str | None = None,
+def list_all(db: Session = Depends(get_read_db), q: str | None = None,
              station: str | None = None, status: str | None = None,
              line_id: str | None = None):
     rows = list_calibrations(db)
@@ -35,7 +35,7 @@ def list_all(db: Session = Depends(get_db), q: str | None = None,
     return [r for r in rows if match(r)]
 
 @router.get("/choices")
-def choices(db: Session = Depends(get_db)):
+def choices(db: Session = Depends(get_read_db)):
     rows = list_calibrations(db)
     stations = sorted({r.Station for r in rows if r.Station})
     lines = sorted({r.LineID for r in rows if r.LineID})
@@ -102,7 +102,7 @@ def delete(cal_id: int, deleted_by: str, db: Session = Depends(get_db)):
     return {"message": "Calibration deleted successfully"}
 
 @router.get("/history/{series}", response_model=List[CalibrationHistoryResponse])
-def history(series: str, db: Session = Depends(get_db)):
+def history(series: str, db: Session = Depends(get_read_db)):
     rows = get_calibration_history(db, series)
     if not rows:
         raise HTTPException(status_code=404, detail="No history found")
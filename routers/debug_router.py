@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from db.query_profiler import slowest_queries, reset_slowest
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+
+@router.get("/slow-queries")
+def list_slow_queries():
+    # เรียงจากช้าที่สุด พร้อม parameter, จำนวนแถว และ plan (ถ้าเปิด SLOW_QUERY_CAPTURE_PLAN)
+    return slowest_queries()
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    reset_slowest()
+    return {"message": "Slow query buffer cleared"}
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, WebSocket
+from services.failure_anomaly_service import ALERT_CHANNEL, RECENT_ALERTS_KEY
+from db.redis_client import r as redis_client
+from utils.ws_connection import ManagedWebSocket
+import asyncio
+import json
+import logging
+
+router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT_SEC = 1.0
+
+
+class AlertRelay:
+    """
+    subscribe ALERT_CHANNEL ครั้งเดียวต่อ process แล้วกระจาย alert ให้ทุก socket ในเครื่อง
+    (ใช้ thread ของ default executor แค่ตัวเดียว ไม่ใช่ตัวละ client) หยุดเองเมื่อไม่มีใครฟัง
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # id(conn) -> (conn, lineId)
+        self._task = None
+
+    def add(self, conn: ManagedWebSocket, line_id: str | None):
+        self._subscribers[id(conn)] = (conn, line_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def remove(self, conn: ManagedWebSocket):
+        self._subscribers.pop(id(conn), None)
+
+    def deliver(self, alert: dict):
+        for conn, line_id in list(self._subscribers.values()):
+            if wanted(alert, line_id):
+                # alert เป็น event ต้องไม่ถูก coalesce ทิ้ง
+                conn.publish([alert], coalesce=False)
+
+    async def _run(self):
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(ALERT_CHANNEL)
+            while self._subscribers:
+                try:
+                    message = await asyncio.to_thread(pubsub.get_message, timeout=POLL_TIMEOUT_SEC)
+                except Exception:
+                    logger.warning("alert relay failed, retrying", exc_info=True)
+                    await asyncio.sleep(POLL_TIMEOUT_SEC)
+                    continue
+                if message:
+                    self.deliver(json.loads(message["data"]))
+        except Exception:
+            logger.exception("alert relay stopped")
+        finally:
+            pubsub.close()
+
+
+def wanted(alert: dict, line_id: str | None) -> bool:
+    # lineId ไม่ส่ง = รับ alert ทุก line
+    return not line_id or alert.get("lineId") == line_id
+
+
+alert_relay = AlertRelay()
+
+
+@router.websocket("/ws/alerts")
+async def failure_alert_ws(websocket: WebSocket):
+    await websocket.accept()
+
+    line_id = websocket.query_params.get("lineId")
+    logger.info("alerts connected lineId=%s", line_id or "ALL")
+
+    try:
+        async with ManagedWebSocket(websocket, "alerts") as conn:
+            alert_relay.add(conn, line_id)
+            try:
+                # ส่ง alert ล่าสุดที่ค้างอยู่ก่อน (เก่า -> ใหม่)
+                raw_recent = await asyncio.to_thread(redis_client.lrange, RECENT_ALERTS_KEY, 0, -1)
+                recent = [json.loads(raw) for raw in reversed(raw_recent)]
+                conn.publish([alert for alert in recent if wanted(alert, line_id)], coalesce=False)
+                await conn.wait_closed()
+            finally:
+                alert_relay.remove(conn)
+
+    except Exception:
+        logger.exception("alerts socket error")
@@ -1,78 +1,224 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from services.failure_filter_service import fetch_failures_filter
-from schemas.failure_schema import FailureByDay, FailureStationQuery
+from fastapi import APIRouter, WebSocket
+from services.failure_filter_service import (fetch_failures_filter, fetch_failures_filter_lines, fetch_failures_hourly,
+                                             fetch_failures_hourly_lines)
+from services.failure_anomaly_service import detect_station_anomalies
+from services.failure_snapshot_service import (snapshot_failures_filter, snapshot_failures_filter_lines,
+                                               split_snapshot_range)
+from schemas.failure_schema import FailureByDay, FailureByLine, FailureStationQuery, FailureLinesQuery
 from fastapi.encoders import jsonable_encoder
-from db.session import SessionLocal
+from db.session import ReadSessionLocal
 from db.redis_client import r as redis_client
 from utils.redis_helper import build_cache_key
-import asyncio
+from utils.failure_helpers import current_work_date, current_work_hour, parse_date_param
+from utils.metrics import observe_cache
+from utils.subscription_hub import hub
+from utils.ws_connection import ManagedWebSocket
 import json
-from datetime import datetime
+import logging
+from datetime import timedelta
 
 router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
 
 UPDATE_INTERVAL_SEC = 15
 CACHE_TTL_SEC = 45
 
 
+def summary_cache_key(line_id: str, start_date, end_date) -> str:
+    # key เดียวกันทั้ง /ws/filter และ /ws/overview เพื่อให้ใช้ผลลัพธ์ร่วมกัน
+    return build_cache_key(
+        namespace="failures",
+        scope=f"{start_date}_{end_date}",
+        line_id=line_id,
+        datatype="summary"
+    )
+
+
+def all_lines_cache_key(start_date, end_date) -> str:
+    return build_cache_key(
+        namespace="failures",
+        scope=f"{start_date}_{end_date}",
+        line_id="all",
+        datatype="lines"
+    )
+
+
+def load_summary(query: FailureStationQuery):
+    cache_key = summary_cache_key(query.lineId, query.startDate, query.endDate)
+    cached_data = redis_client.get(cache_key)
+    observe_cache("summary", bool(cached_data))
+
+    if cached_data:
+        logger.debug("cache hit key=%s", cache_key)
+        return json.loads(cached_data)
+
+    logger.debug("cache miss key=%s, querying DB", cache_key)
+    # วันที่ปิดแล้วอ่านจาก snapshot ยิง DB เฉพาะวันนี้ (และวันที่ยังไม่ export)
+    snapshot_end, db_start = split_snapshot_range(query.startDate, query.endDate, "summary")
+    raw_data = snapshot_failures_filter(query.lineId, query.startDate, snapshot_end) if snapshot_end else []
+    with ReadSessionLocal() as db:
+        if db_start:
+            raw_data += fetch_failures_filter(query.model_copy(update={"startDate": db_start}), db)
+        serialized_data = [
+            FailureByDay.model_validate(row).model_dump()
+            for row in raw_data
+        ]
+        # ตรวจ spike ราย station ทุกครั้งที่ refresh จาก DB
+        detect_summary_anomalies(query.lineId, query.startDate, query.endDate, serialized_data, db)
+
+    redis_safe_data = jsonable_encoder(serialized_data)
+    redis_client.setex(
+        cache_key,
+        CACHE_TTL_SEC,
+        json.dumps(redis_safe_data)
+    )
+    return redis_safe_data
+
+
+def detect_summary_anomalies(line_id: str, start_date, end_date, serialized_data: list[dict], db,
+                             hourly_data: list[dict] | None = None):
+    """
+    ตรวจ spike เฉพาะเมื่อช่วงที่ขอรวมวันนี้ (bucket ที่ยังเปิดอยู่) ช่วงในอดีตไม่ถูกนำมาแจ้งเตือนย้อนหลัง
+    ถูกเรียกทั้งจาก summary และ overview เพราะทั้งสองเติม cache key เดียวกัน
+    hourly_data: แถวรายชั่วโมงของวันนี้ที่ดึงมาแล้ว (overview ดึงทุก line ครั้งเดียว) None = ดึงเอง
+    """
+    today = current_work_date()
+    if not start_date <= today <= end_date:
+        return
+    # วัน/ชั่วโมงที่ไม่มี fail เลยจะไม่มีแถวใน query จึงเติม 0 ให้ก่อน
+    daily_rows = {str(row["workDate"]): row for row in serialized_data}
+    daily_buckets = [
+        daily_rows.get(str(day), {"workDate": str(day)})
+        for day in (start_date + timedelta(days=i) for i in range((today - start_date).days + 1))
+    ]
+    detect_station_anomalies(redis_client, line_id, "day", daily_buckets, "workDate", str(today))
+    hour = current_work_hour()
+    if hourly_data is None:
+        hourly_data = fetch_failures_hourly(line_id, today, db)
+    hourly_rows = {row["workHour"]: row for row in hourly_data}
+    hourly_buckets = [
+        {**hourly_rows.get(h, {}), "bucket": f"{today}T{h:02d}"}
+        for h in range(hour + 1)
+    ]
+    detect_station_anomalies(redis_client, line_id, "hour", hourly_buckets, "bucket", f"{today}T{hour:02d}")
+
+
+def parse_summary_params(params) -> FailureStationQuery:
+    return FailureStationQuery(
+        lineId=params.get("lineId") or "BMA01",
+        startDate=parse_date_param(params.get("startDate")),
+        endDate=parse_date_param(params.get("endDate"))
+    )
+
+
 @router.websocket("/ws/filter")
 async def failure_filter_ws(websocket: WebSocket):
     await websocket.accept()
-    print("✅ WebSocket connected")
 
-    line_id = websocket.query_params.get("lineId", "BMA01")
-    start_date_str = websocket.query_params.get("startDate")
-    end_date_str = websocket.query_params.get("endDate")
+    failure_query_data = parse_summary_params(websocket.query_params)
+    line_id = failure_query_data.lineId
+    logger.info("filter connected lineId=%s startDate=%s endDate=%s",
+                line_id, failure_query_data.startDate, failure_query_data.endDate)
 
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else datetime.today().date()
-    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else datetime.today().date()
-    print(f"ℹ️ lineId: {line_id}, startDate: {start_date}, endDate: {end_date}")
+    try:
+        async with ManagedWebSocket(websocket, "filter") as conn:
+            await hub.stream(conn, "summary", load_summary, failure_query_data, UPDATE_INTERVAL_SEC)
+
+    except Exception:
+        logger.exception("filter socket error lineId=%s", line_id)
+
+
+def load_overview(query: FailureLinesQuery):
+    """
+    โหลด summary ของหลาย line: ถ้า cache ครบทุก line ใช้ cache เลย
+    ถ้าไม่ครบ ยิง DB ครั้งเดียว (GROUP BY LineID, workDate) แล้ว cache แยกราย line
+    """
+    line_ids = query.lineIds
+    if not line_ids:
+        cached_lines = redis_client.get(all_lines_cache_key(query.startDate, query.endDate))
+        line_ids = json.loads(cached_lines) if cached_lines else None
+
+    if line_ids:
+        keys = [summary_cache_key(line_id, query.startDate, query.endDate) for line_id in line_ids]
+        cached = redis_client.mget(keys)
+        hit = all(raw is not None for raw in cached)
+        observe_cache("overview", hit)
+        if hit:
+            logger.debug("overview cache hit lines=%d", len(line_ids))
+            return [
+                {"lineId": line_id, "days": json.loads(raw)}
+                for line_id, raw in zip(line_ids, cached)
+            ]
+
+    else:
+        observe_cache("overview", False)
+
+    logger.debug("overview cache miss lineIds=%s, querying DB", query.lineIds or "ALL")
+    snapshot_end, db_start = split_snapshot_range(query.startDate, query.endDate, "overview")
+    by_line = snapshot_failures_filter_lines(query.lineIds, query.startDate, snapshot_end) if snapshot_end else {}
+    with ReadSessionLocal() as db:
+        if db_start:
+            fetched = fetch_failures_filter_lines(query.model_copy(update={"startDate": db_start}), db)
+            for line_id, rows in fetched.items():
+                by_line.setdefault(line_id, []).extend(rows)
+
+        overview = [
+            FailureByLine(lineId=line_id, days=[FailureByDay.model_validate(row) for row in rows]).model_dump()
+            for line_id, rows in sorted(by_line.items())
+        ]
+        # overview เติม summary cache ของทุก line ไว้ (load_summary จะ cache hit) จึงต้องตรวจ spike ที่นี่ด้วย
+        # รายชั่วโมงของทุก line ดึงใน query เดียว (GROUP BY LineID, workHour) ไม่ยิงทีละ line
+        today = current_work_date()
+        if query.startDate <= today <= query.endDate:
+            hourly_by_line = fetch_failures_hourly_lines(query.lineIds, today, db)
+            for item in overview:
+                detect_summary_anomalies(item["lineId"], query.startDate, query.endDate, item["days"], db,
+                                         hourly_by_line.get(item["lineId"], []))
 
-    failure_query_data = FailureStationQuery(
-        lineId=line_id,
-        startDate=start_date,
-        endDate=end_date
+    pipe = redis_client.pipeline()
+    for item in overview:
+        pipe.setex(
+            summary_cache_key(item["lineId"], query.startDate, query.endDate),
+            CACHE_TTL_SEC,
+            json.dumps(jsonable_encoder(item["days"]))
+        )
+    if not query.lineIds:
+        pipe.setex(
+            all_lines_cache_key(query.startDate, query.endDate),
+            CACHE_TTL_SEC,
+            json.dumps([item["lineId"] for item in overview])
+        )
+    pipe.execute()
+
+    return jsonable_encoder(overview)
+
+
+def parse_overview_params(params) -> FailureLinesQuery:
+    # lineIds=BMA01,BMA02 (หรือ list ใน /failures/ws) ไม่ส่ง / lineIds=all = ทุก line
+    line_ids = params.get("lineIds") or []
+    if isinstance(line_ids, str):
+        line_ids = line_ids.split(",")
+    line_ids = [str(x).strip() for x in line_ids if str(x).strip()]
+    if [x.lower() for x in line_ids] == ["all"]:
+        line_ids = []
+    return FailureLinesQuery(
+        lineIds=sorted(set(line_ids)) or None,
+        startDate=parse_date_param(params.get("startDate")),
+        endDate=parse_date_param(params.get("endDate"))
     )
 
+
+@router.websocket("/ws/overview")
+async def failure_overview_ws(websocket: WebSocket):
+    await websocket.accept()
+
+    overview_query = parse_overview_params(websocket.query_params)
+    logger.info("overview connected lineIds=%s startDate=%s endDate=%s",
+                overview_query.lineIds or "ALL", overview_query.startDate, overview_query.endDate)
+
     try:
-            while True:
-                cache_key = build_cache_key(
-                    namespace="failures",
-                    scope=f"{start_date}_{end_date}",
-                    line_id=line_id,
-                    datatype="summary"
-                )
-
-                cached_data = redis_client.get(cache_key)
-
-                if cached_data:
-                    print(f"📦 ใช้ cache: {cache_key}")
-                    serialized_data = json.loads(cached_data)
-                else:
-                    print(f"🗃️ ดึงจาก DB lineId={line_id}")
-                    with SessionLocal() as db:
-                        raw_data = fetch_failures_filter(failure_query_data, db)
-                        serialized_data = [
-                            FailureByDay.model_validate(row).model_dump()
-                            for row in raw_data
-                        ]
-                    redis_safe_data = jsonable_encoder(serialized_data)
-                    redis_client.setex(
-                        cache_key,
-                        CACHE_TTL_SEC,
-                        json.dumps(redis_safe_data)
-                    )
-                    print(f"✅ cache ใหม่: {cache_key}")
-
-                await websocket.send_json(jsonable_encoder(serialized_data))
-                await asyncio.sleep(UPDATE_INTERVAL_SEC)
-
-
-    except WebSocketDisconnect:
-        print("❌ Client disconnected")
-
-    except Exception as e:
-        print(f"❗ Unexpected error: {e}")
-
-    finally:
-        print("🔒 Connection closed")
+        async with ManagedWebSocket(websocket, "overview") as conn:
+            await hub.stream(conn, "overview", load_overview, overview_query, UPDATE_INTERVAL_SEC)
+
+    except Exception:
+        logger.exception("overview socket error")
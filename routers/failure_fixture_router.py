@@ -1,76 +1,74 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket
 from services.failure_fixture_service import fetch_failure_fixture
 from schemas.failure_schema import FailureFixture, FailureByFixture
 from fastapi.encoders import jsonable_encoder
-from db.session import SessionLocal
+from db.session import ReadSessionLocal
 from db.redis_client import r as redis_client
 from utils.redis_helper import build_cache_key
-import asyncio
+from utils.metrics import observe_cache
+from utils.failure_helpers import parse_date_param
+from utils.subscription_hub import hub
+from utils.ws_connection import ManagedWebSocket
 import json
-from datetime import datetime
+import logging
 router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
 
 UPDATE_INTERVAL_SEC = 175
 CACHE_TTL_SEC = 300
 
 
-@router.websocket("/ws/fixture")
-async def failure_fixture_ws(websocket: WebSocket):
-    await websocket.accept()
-    print("✅ WebSocket connected")
+def load_fixture(query: FailureFixture):
+    cache_key = build_cache_key(
+        namespace="failures",
+        scope=f"{query.startDate}_{query.endDate}",
+        line_id=query.lineId,
+        datatype="fixture"
+    )
 
-    line_id = websocket.query_params.get("lineId", "BMA01")
-    start_date_str = websocket.query_params.get("startDate")
-    end_date_str = websocket.query_params.get("endDate")
+    cached_data = redis_client.get(cache_key)
+    observe_cache("fixture", bool(cached_data))
 
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else datetime.today().date()
-    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else datetime.today().date()
-    print(f"ℹ️ lineId: {line_id}, startDate: {start_date}, endDate: {end_date}")
+    if cached_data:
+        logger.debug("cache hit key=%s", cache_key)
+        return json.loads(cached_data)
 
-    failure_query_data = FailureFixture(
-        lineId=line_id,
-        startDate=start_date,
-        endDate=end_date
+    logger.debug("cache miss key=%s, querying DB", cache_key)
+    with ReadSessionLocal() as db:
+        raw_data = fetch_failure_fixture(query, db)
+        serialized_data = [
+            FailureByFixture.model_validate(row).model_dump()
+            for row in raw_data
+        ]
+    redis_safe_data = jsonable_encoder(serialized_data)
+    redis_client.setex(
+        cache_key,
+        CACHE_TTL_SEC,
+        json.dumps(redis_safe_data)
     )
+    return redis_safe_data
 
-    try:
-        while True:
-            cache_key = build_cache_key(
-                namespace="failures",
-                scope=f"{start_date}_{end_date}",
-                line_id=line_id,
-                datatype="fixture"
-            )
 
-            cached_data = redis_client.get(cache_key)
+def parse_fixture_params(params) -> FailureFixture:
+    return FailureFixture(
+        lineId=params.get("lineId") or "BMA01",
+        startDate=parse_date_param(params.get("startDate")),
+        endDate=parse_date_param(params.get("endDate"))
+    )
 
-            if cached_data:
-                print(f"📦 ใช้ cache: {cache_key}")
-                serialized_data = json.loads(cached_data)
-            else:
-                print(f"🗃️ ดึงจาก DB lineId={line_id}, startDate= {start_date}, endDate= {end_date}")
-                with SessionLocal() as db:
-                    raw_data = fetch_failure_fixture(failure_query_data, db)
-                    serialized_data = [
-                        FailureByFixture.model_validate(row).model_dump()
-                        for row in raw_data
-                    ]
-                redis_safe_data = jsonable_encoder(serialized_data)
-                redis_client.setex(
-                    cache_key,
-                    CACHE_TTL_SEC,
-                    json.dumps(redis_safe_data)
-                )
-                print(f"✅ cache ใหม่: {cache_key}")
 
-            await websocket.send_json(jsonable_encoder(serialized_data))
-            await asyncio.sleep(UPDATE_INTERVAL_SEC)
+@router.websocket("/ws/fixture")
+async def failure_fixture_ws(websocket: WebSocket):
+    await websocket.accept()
 
-    except WebSocketDisconnect:
-        print("❌ Client disconnected")
+    failure_query_data = parse_fixture_params(websocket.query_params)
+    line_id = failure_query_data.lineId
+    logger.info("fixture connected lineId=%s startDate=%s endDate=%s",
+                line_id, failure_query_data.startDate, failure_query_data.endDate)
 
-    except Exception as e:
-        print(f"❗ Unexpected error: {e}")
+    try:
+        async with ManagedWebSocket(websocket, "fixture") as conn:
+            await hub.stream(conn, "fixture", load_fixture, failure_query_data, UPDATE_INTERVAL_SEC)
 
-    finally:
-        print("🔒 Connection closed")
\ No newline at end of file
+    except Exception:
+        logger.exception("fixture socket error lineId=%s", line_id)
@@ -0,0 +1,110 @@
+from fastapi import APIRouter, HTTPException, Query
+from services.failure_pareto_service import fetch_pareto_counts, build_pareto
+from services.failure_snapshot_service import snapshot_pareto_counts, split_snapshot_range
+from schemas.failure_schema import FailurePareto, FailureParetoResponse
+from db.session import ReadSessionLocal
+from db.redis_client import r as redis_client
+from utils.redis_helper import build_cache_key
+from utils.failure_helpers import contiguous_runs, current_work_date
+from utils.metrics import observe_cache
+from datetime import date, timedelta
+from typing import Literal, Optional
+import json
+import logging
+
+router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
+
+# วันที่ปิดแล้วข้อมูลไม่เปลี่ยน เก็บ cache ได้นาน ส่วนวันนี้ใช้ TTL สั้น
+CLOSED_DAY_TTL_SEC = 7 * 24 * 3600
+OPEN_DAY_TTL_SEC = 300
+MAX_RANGE_DAYS = 120
+
+
+def day_cache_key(line_id: str, work_date: date) -> str:
+    return build_cache_key(
+        namespace="failures",
+        scope="pareto",
+        line_id=line_id,
+        work_date=work_date.isoformat()
+    )
+
+
+def load_pareto_rows(line_id: str, start_date: date, end_date: date):
+    """
+    โหลด rows ราย workDate จาก cache ก่อน วันที่ขาดอ่านจาก snapshot (วันที่ปิดแล้ว)
+    แล้วค่อยยิง DB สำหรับส่วนที่เหลือ (หนึ่ง query ต่อช่วงวันที่ขาดที่ติดกัน)
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    keys = [day_cache_key(line_id, d) for d in days]
+    cached = redis_client.mget(keys)
+
+    rows = []
+    missing = []
+    for day, raw in zip(days, cached):
+        if raw is None:
+            missing.append(day)
+        else:
+            rows.extend(json.loads(raw))
+
+    observe_cache("pareto", not missing)
+    if not missing:
+        logger.debug("pareto cache hit lineId=%s %s..%s", line_id, start_date, end_date)
+        return rows
+
+    # query ทีละช่วงของวันที่ขาดที่ติดกัน ไม่ scan วันที่ cache ไว้แล้วที่อยู่ระหว่างกลาง (เช่นวันนี้ + วันเก่าหนึ่งวัน)
+    fetched = []
+    with ReadSessionLocal() as db:
+        for run_start, run_end in contiguous_runs(missing):
+            logger.debug("pareto cache miss lineId=%s %s..%s, querying DB", line_id, run_start, run_end)
+            snapshot_end, db_start = split_snapshot_range(run_start, run_end, "pareto")
+            if snapshot_end:
+                fetched += snapshot_pareto_counts(line_id, run_start, snapshot_end)
+            if db_start:
+                fetched += fetch_pareto_counts(line_id, db_start, run_end, db)
+
+    by_day = {d.isoformat(): [] for d in missing}
+    for row in fetched:
+        if row["workDate"] in by_day:
+            by_day[row["workDate"]].append(row)
+
+    today = current_work_date()
+    pipe = redis_client.pipeline()
+    for day in missing:
+        ttl = CLOSED_DAY_TTL_SEC if day < today else OPEN_DAY_TTL_SEC
+        pipe.setex(day_cache_key(line_id, day), ttl, json.dumps(by_day[day.isoformat()]))
+        rows.extend(by_day[day.isoformat()])
+    pipe.execute()
+
+    return rows
+
+
+@router.get("/pareto", response_model=FailureParetoResponse)
+def failure_pareto(
+        lineId: str = "BMA01",
+        startDate: Optional[date] = None,
+        endDate: Optional[date] = None,
+        bucket: Literal["none", "hour", "shift", "day"] = "none",
+        top: Optional[int] = Query(None, ge=1)
+):
+    today = current_work_date()
+    query = FailurePareto(
+        lineId=lineId,
+        startDate=startDate or today,
+        endDate=endDate or today,
+        bucket=bucket,
+        top=top
+    )
+    if query.endDate < query.startDate:
+        raise HTTPException(status_code=400, detail="endDate must not be before startDate")
+    if (query.endDate - query.startDate).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+
+    rows = load_pareto_rows(query.lineId, query.startDate, query.endDate)
+    return {
+        "lineId": query.lineId,
+        "startDate": query.startDate,
+        "endDate": query.endDate,
+        "bucket": query.bucket,
+        **build_pareto(rows, query.bucket, query.top)
+    }
@@ -1,72 +1,75 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket
 from services.failure_station_service import fetch_failure_station
 from schemas.failure_schema import FailureStation, FailureByStation
 from fastapi.encoders import jsonable_encoder
-from db.session import SessionLocal
+from db.session import ReadSessionLocal
 from db.redis_client import r as redis_client
 from utils.redis_helper import build_cache_key
-import asyncio
+from utils.metrics import observe_cache
+from utils.subscription_hub import hub
+from utils.ws_connection import ManagedWebSocket
 import json
+import logging
 
 router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
 
 UPDATE_INTERVAL_SEC = 175
 CACHE_TTL_SEC = 300
 
 
-@router.websocket("/ws/station")
-async def failure_station_ws(websocket: WebSocket):
-    await websocket.accept()
-    print("✅ WebSocket connected")
+def load_station(query: FailureStation):
+    cache_key = build_cache_key(
+        namespace="failures",
+        scope="daily",
+        line_id=query.lineId,
+        station=query.station.lower(),
+        work_date=query.workDate # ส่ง work_date ที่เป็น string เข้าไปเลย
+    )
 
-    line_id = websocket.query_params.get("lineId", "BMA01")
-    station_name = websocket.query_params.get("station", "HEATUP").upper()
-    work_date = websocket.query_params.get("workDate")
+    cached_data = redis_client.get(cache_key)
+    observe_cache("station", bool(cached_data))
 
-    print(f"ℹ️ lineId: {line_id}, station: {station_name}, workDate: {work_date}")
+    if cached_data:
+        logger.debug("cache hit key=%s", cache_key)
+        return json.loads(cached_data)
 
-    failure_query_data = FailureStation(lineId=line_id, station=station_name, workDate=work_date)
+    logger.debug("cache miss key=%s, querying DB", cache_key)
+    with ReadSessionLocal() as db:
+        raw_data = fetch_failure_station(query, db)
+        serialized_data = [
+            FailureByStation.model_validate(row).model_dump()
+            for row in raw_data
+        ]
+    redis_safe_data = jsonable_encoder(serialized_data)
+    redis_client.setex(
+        cache_key,
+        CACHE_TTL_SEC,
+        json.dumps(redis_safe_data)
+    )
+    return redis_safe_data
 
-    try:
-        while True:
-            # แก้ไขส่วนนี้: เรียกใช้ build_cache_key โดยส่งค่าที่ถูกต้อง
-            cache_key = build_cache_key(
-                namespace="failures",
-                scope="daily",
-                line_id=line_id,
-                station=station_name.lower(),
-                work_date=work_date # ส่ง work_date ที่เป็น string เข้าไปเลย
-            )
 
-            cached_data = redis_client.get(cache_key)
+def parse_station_params(params) -> FailureStation:
+    return FailureStation(
+        lineId=params.get("lineId") or "BMA01",
+        station=(params.get("station") or "HEATUP").upper(),
+        workDate=params.get("workDate")
+    )
 
-            if cached_data:
-                print(f"📦 ใช้ cache: {cache_key}")
-                serialized_data = json.loads(cached_data)
-            else:
-                print(f"🗃️ ดึงจาก DB lineId={line_id}")
-                with SessionLocal() as db:
-                    raw_data = fetch_failure_station(failure_query_data, db)
-                    serialized_data = [
-                        FailureByStation.model_validate(row).model_dump()
-                        for row in raw_data
-                    ]
-                redis_safe_data = jsonable_encoder(serialized_data)
-                redis_client.setex(
-                    cache_key,
-                    CACHE_TTL_SEC,
-                    json.dumps(redis_safe_data)
-                )
-                print(f"✅ cache ใหม่: {cache_key}")
 
-            await websocket.send_json(jsonable_encoder(serialized_data))
-            await asyncio.sleep(UPDATE_INTERVAL_SEC)
+@router.websocket("/ws/station")
+async def failure_station_ws(websocket: WebSocket):
+    await websocket.accept()
 
-    except WebSocketDisconnect:
-        print("❌ Client disconnected")
+    failure_query_data = parse_station_params(websocket.query_params)
+    line_id = failure_query_data.lineId
+    logger.info("station connected lineId=%s station=%s workDate=%s",
+                line_id, failure_query_data.station, failure_query_data.workDate)
 
-    except Exception as e:
-        print(f"❗ Unexpected error: {e}")
+    try:
+        async with ManagedWebSocket(websocket, "station") as conn:
+            await hub.stream(conn, "station", load_station, failure_query_data, UPDATE_INTERVAL_SEC)
 
-    finally:
-        print("🔒 Connection closed")
\ No newline at end of file
+    except Exception:
+        logger.exception("station socket error lineId=%s", line_id)
@@ -1,93 +1,90 @@
 # Backend Python WebSocket Server
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket
 from services.failure_tester_service import fetch_failure_tester
 from schemas.failure_schema import FailureTester, FailureByTester
 from fastapi.encoders import jsonable_encoder
-from db.session import SessionLocal
+from db.session import ReadSessionLocal
 from db.redis_client import r as redis_client
 from utils.redis_helper import build_cache_key
-import asyncio
+from utils.metrics import observe_cache
+from utils.failure_helpers import parse_date_param
+from utils.subscription_hub import hub
+from utils.ws_connection import ManagedWebSocket
 import json
-from datetime import datetime
+import logging
 
 router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
 
 UPDATE_INTERVAL_SEC = 175
 CACHE_TTL_SEC = 300
 
 
+def load_tester(query: FailureTester):
+    # CORRECTED: Include dates in the cache key to ensure data freshness for each date range
+    cache_key = build_cache_key(
+        namespace="failures tester",
+        scope="select_date",
+        line_id=query.lineId,
+        station=query.station.lower() if query.station else "all",
+        start_date = query.startDate.isoformat(),
+        end_date = query.endDate.isoformat()
+    )
+
+    cached_data = redis_client.get(cache_key)
+    observe_cache("tester", bool(cached_data))
+
+    if cached_data:
+        logger.debug("cache hit key=%s", cache_key)
+        return json.loads(cached_data)
+
+    logger.debug("cache miss key=%s, querying DB", cache_key)
+    with ReadSessionLocal() as db:
+        raw_data = fetch_failure_tester(query, db)
+        serialized_data = [
+            FailureByTester.model_validate(row).model_dump()
+            for row in raw_data
+        ]
+
+    redis_safe_data = jsonable_encoder(serialized_data)
+    redis_client.setex(
+        cache_key,
+        CACHE_TTL_SEC,
+        json.dumps(redis_safe_data)
+    )
+    return redis_safe_data
+
+
+def parse_tester_params(params) -> FailureTester:
+    station_name = params.get("station")
+    # ถ้า station มีค่า ให้เปลี่ยนเป็นตัวพิมพ์ใหญ่ แต่ถ้าไม่มี (None) ก็ใช้ None ต่อไป
+    return FailureTester(
+        lineId=params.get("lineId") or "BMA01",
+        station=station_name.upper() if station_name else None,
+        startDate=parse_date_param(params.get("startDate")),
+        endDate=parse_date_param(params.get("endDate"))
+    )
+
+
 @router.websocket("/ws/tester")
 async def failure_tester_ws(websocket: WebSocket):
     await websocket.accept()
-    print("✅ WebSocket connected")
-
-    line_id = websocket.query_params.get("lineId", "BMA01")
-    station_name = websocket.query_params.get("station")
-    # ถ้า station มีค่า ให้เปลี่ยนเป็นตัวพิมพ์ใหญ่ แต่ถ้าไม่มี (None) ก็ใช้ None ต่อไป
-    station_name = station_name.upper() if station_name else None
-    start_date_str = websocket.query_params.get("startDate")
-    end_date_str = websocket.query_params.get("endDate")
 
     # Parsing dates from query parameters
     try:
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else datetime.today().date()
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else datetime.today().date()
+        failure_query_data = parse_tester_params(websocket.query_params)
     except (ValueError, TypeError) as e:
-        print(f"❗ Error parsing dates: {e}. Using today's date.")
+        logger.warning("tester invalid params %s: %s", dict(websocket.query_params), e)
         await websocket.send_json({"error": "Invalid date format. Using today's date."})
         return
 
-    print(f"ℹ️ lineId: {line_id}, station: {station_name}, startDate: {start_date}, endDate: {end_date}")
-
-    failure_query_data = FailureTester(
-        lineId=line_id,
-        station=station_name,
-        startDate=start_date,
-        endDate=end_date
-    )
+    line_id = failure_query_data.lineId
+    logger.info("tester connected lineId=%s station=%s startDate=%s endDate=%s",
+                line_id, failure_query_data.station, failure_query_data.startDate, failure_query_data.endDate)
 
     try:
-        while True:
-            # CORRECTED: Include dates in the cache key to ensure data freshness for each date range
-            cache_key = build_cache_key(
-                namespace="failures tester",
-                scope="select_date",
-                line_id=line_id,
-                station=station_name.lower() if station_name else "all",
-                start_date = start_date.isoformat(),
-                end_date = end_date.isoformat()
-            )
-
-            cached_data = redis_client.get(cache_key)
-
-            if cached_data:
-                print(f"📦 ใช้ cache: {cache_key}")
-                serialized_data = json.loads(cached_data)
-            else:
-                print(f"🗃️ ดึงจาก DB lineId={line_id} for date range {start_date} to {end_date}")
-                with SessionLocal() as db:
-                    raw_data = fetch_failure_tester(failure_query_data, db)
-                    serialized_data = [
-                        FailureByTester.model_validate(row).model_dump()
-                        for row in raw_data
-                    ]
-
-                redis_safe_data = jsonable_encoder(serialized_data)
-                redis_client.setex(
-                    cache_key,
-                    CACHE_TTL_SEC,
-                    json.dumps(redis_safe_data)
-                )
-                print(f"✅ cache ใหม่: {cache_key}")
-
-            await websocket.send_json(jsonable_encoder(serialized_data))
-            await asyncio.sleep(UPDATE_INTERVAL_SEC)
-
-    except WebSocketDisconnect:
-        print("❌ Client disconnected")
-
-    except Exception as e:
-        print(f"❗ Unexpected error: {e}")
-
-    finally:
-        print("🔒 Connection closed")
\ No newline at end of file
+        async with ManagedWebSocket(websocket, "tester") as conn:
+            await hub.stream(conn, "tester", load_tester, failure_query_data, UPDATE_INTERVAL_SEC)
+
+    except Exception:
+        logger.exception("tester socket error lineId=%s", line_id)
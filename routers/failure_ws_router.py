@@ -0,0 +1,136 @@
+"""
+/failures/ws: socket เดียวต่อ dashboard แทนการเปิด /ws/filter, /ws/station ฯลฯ แยกกัน
+
+client ส่ง (JSON):
+    {"action": "subscribe",   "channel": "c1", "type": "summary", "params": {"lineId": "BMA01", ...}}
+    {"action": "update",      "channel": "c1", "params": {"startDate": "2025-01-01"}}   # merge กับ params เดิม
+    {"action": "unsubscribe", "channel": "c1"}
+
+server ส่ง:
+    {"channel": "c1", "type": "data", "data": [...]}
+    {"channel": "c1", "type": "ack", "action": "subscribe"}
+    {"channel": "c1", "type": "error", "error": "..."}
+
+params ของแต่ละ type เหมือน query string ของ socket เดิม
+client ที่ขอ type + params เดียวกัน (ทั้ง socket นี้และ socket เดิม) ใช้ refresh task ร่วมกัน
+"""
+import importlib
+import json
+import logging
+from fastapi import APIRouter, WebSocket
+from utils.subscription_hub import hub
+from utils.ws_connection import ManagedWebSocket
+
+router = APIRouter(prefix="/failures", tags=["Failures"])
+logger = logging.getLogger(__name__)
+
+MAX_CHANNELS = 20
+
+# routers/__init__.py ผูกชื่อ module เหล่านี้กับ APIRouter จึงต้องดึง module จาก import_module
+failure_filter_router = importlib.import_module("routers.failure_filter_router")
+failure_station_router = importlib.import_module("routers.failure_station_router")
+failure_fixture_router = importlib.import_module("routers.failure_fixture_router")
+failure_tester_router = importlib.import_module("routers.failure_tester_router")
+
+# type -> (router module, loader, parser) interval อ่านจาก module ตอน subscribe
+FEED_TYPES = {
+    "summary": (failure_filter_router, failure_filter_router.load_summary,
+                failure_filter_router.parse_summary_params),
+    "overview": (failure_filter_router, failure_filter_router.load_overview,
+                 failure_filter_router.parse_overview_params),
+    "station": (failure_station_router, failure_station_router.load_station,
+                failure_station_router.parse_station_params),
+    "fixture": (failure_fixture_router, failure_fixture_router.load_fixture,
+                failure_fixture_router.parse_fixture_params),
+    "tester": (failure_tester_router, failure_tester_router.load_tester,
+               failure_tester_router.parse_tester_params),
+}
+
+
+class MultiplexWebSocket(ManagedWebSocket):
+    def __init__(self, websocket: WebSocket):
+        super().__init__(websocket, "multiplex")
+        self.channels = {}  # channel -> (type, params, feed key)
+
+    def reply(self, channel, kind: str, **fields):
+        self.publish({"channel": channel, "type": kind, **fields}, coalesce=False)
+
+    def on_message(self, message: str):
+        try:
+            request = json.loads(message)
+        except ValueError:
+            self.reply(None, "error", error="invalid JSON")
+            return
+        if not isinstance(request, dict):
+            self.reply(None, "error", error="message must be an object")
+            return
+
+        action = request.get("action")
+        channel = request.get("channel")
+        if not isinstance(channel, str) or not channel:
+            self.reply(None, "error", error="channel is required")
+            return
+
+        if action == "subscribe":
+            self.subscribe(channel, request.get("type"), request.get("params") or {})
+        elif action == "update":
+            if channel not in self.channels:
+                self.reply(channel, "error", error="unknown channel")
+                return
+            kind, params, _ = self.channels[channel]
+            self.subscribe(channel, request.get("type") or kind, {**params, **(request.get("params") or {})})
+        elif action == "unsubscribe":
+            self.unsubscribe(channel)
+            self.reply(channel, "ack", action="unsubscribe")
+        else:
+            self.reply(channel, "error", error=f"unknown action: {action}")
+
+    def subscribe(self, channel: str, kind, params):
+        if kind not in FEED_TYPES:
+            self.reply(channel, "error", error=f"unknown type: {kind}")
+            return
+        if not isinstance(params, dict):
+            self.reply(channel, "error", error="params must be an object")
+            return
+        if channel not in self.channels and len(self.channels) >= MAX_CHANNELS:
+            self.reply(channel, "error", error=f"too many channels (max {MAX_CHANNELS})")
+            return
+
+        module, loader, parse = FEED_TYPES[kind]
+        try:
+            query = parse(params)
+        except (ValueError, TypeError) as e:
+            self.reply(channel, "error", error=f"invalid params: {e}")
+            return
+
+        # ack ก่อน เพื่อให้ client ได้ ack ก่อน data ของ feed ที่มีข้อมูลอยู่แล้ว
+        self.reply(channel, "ack", action="subscribe")
+        self.unsubscribe(channel)
+        key = hub.subscribe(kind, loader, query, module.UPDATE_INTERVAL_SEC, self, channel)
+        self.channels[channel] = (kind, params, key)
+        logger.debug("multiplex subscribe channel=%s key=%s", channel, key)
+
+    def unsubscribe(self, channel: str):
+        entry = self.channels.pop(channel, None)
+        if entry is not None:
+            hub.unsubscribe(entry[2], self, channel)
+
+    def unsubscribe_all(self):
+        for channel in list(self.channels):
+            self.unsubscribe(channel)
+
+
+@router.websocket("/ws")
+async def failures_multiplex_ws(websocket: WebSocket):
+    await websocket.accept()
+    logger.info("multiplex connected")
+
+    try:
+        async with MultiplexWebSocket(websocket) as conn:
+            try:
+                await conn.wait_closed()
+            finally:
+                conn.unsubscribe_all()
+
+    except Exception:
+        logger.exception("multiplex socket error")
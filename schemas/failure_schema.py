@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import date,datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class FailureStationQuery(BaseModel):
     lineId: str
@@ -12,6 +12,11 @@ class FailureSelectStation(BaseModel):
     startDate: Optional[date] = None
     endDate: Optional[date] = None
 
+class FailureLinesQuery(BaseModel):
+    lineIds: Optional[List[str]] = None  # None = ทุก line
+    startDate: date
+    endDate: date
+
 class FailureByDay(BaseModel):
     workDate: date
     vflash1: int
@@ -26,6 +31,10 @@ class FailureByDay(BaseModel):
     ats3: int
     total: int
 
+class FailureByLine(BaseModel):
+    lineId: str
+    days: List[FailureByDay]
+
 class FailureByStation(BaseModel):
     sn: str
     model: str
@@ -64,4 +73,34 @@ class FailureByTester(BaseModel):
     testerId: str
     fixtureId: str
     failItem: Optional[str] = None
-    workDate: datetime
\ No newline at end of file
+    workDate: datetime
+
+class FailurePareto(BaseModel):
+    lineId: str
+    startDate: date
+    endDate: date
+    bucket: Literal["none", "hour", "shift", "day"] = "none"
+    top: Optional[int] = None  # None = ส่งทุกอันดับ
+
+class ParetoItem(BaseModel):
+    key: str
+    count: int
+    percent: float
+    cumulativePercent: float
+
+class ParetoSet(BaseModel):
+    total: int
+    failItem: List[ParetoItem]
+    testerId: List[ParetoItem]
+    fixtureId: List[ParetoItem]
+
+class ParetoBucket(ParetoSet):
+    bucket: str
+
+class FailureParetoResponse(BaseModel):
+    lineId: str
+    startDate: date
+    endDate: date
+    bucket: str
+    overall: ParetoSet
+    buckets: List[ParetoBucket] = []
@@ -0,0 +1,156 @@
+import json
+import logging
+import math
+from datetime import datetime
+from redis import Redis
+from utils.failure_helpers import STATION_KEYS
+from utils.redis_helper import build_cache_key
+
+logger = logging.getLogger(__name__)
+
+ALERT_CHANNEL = "failures:alerts"
+RECENT_ALERTS_KEY = "failures:alerts:recent"
+RECENT_ALERTS_MAX = 50
+STATS_TTL_SEC = 90 * 24 * 3600
+
+# EWMA: alpha สูง = ปรับตามข้อมูลใหม่เร็ว
+EWMA_ALPHA = {"day": 0.2, "hour": 0.1}
+Z_THRESHOLD = 3.0
+# ต้องมีประวัติอย่างน้อยกี่ bucket ก่อนเริ่มแจ้งเตือน (~2/alpha) ช่วงนี้ใช้ mean / variance แบบ Welford
+# แทน EWMA ที่เริ่มจาก var = 0 (variance ต่ำเกินจริงตอนเพิ่งเปิด dashboard แล้วแจ้งเตือนผิด)
+MIN_SAMPLES = {"day": 10, "hour": 20}
+MIN_DELTA = 3     # ต้องสูงกว่าค่าเฉลี่ยอย่างน้อยกี่ชิ้น กันแจ้งเตือนจากเลขน้อย ๆ
+MIN_STD = 1.0
+
+
+def stats_key(line_id: str, station: str, granularity: str) -> str:
+    return build_cache_key(
+        namespace="failures",
+        scope="anomaly",
+        line_id=line_id,
+        station=station,
+        datatype=granularity
+    )
+
+
+def ewma_update(mean: float, var: float, n: int, x: float, alpha: float, warmup: int):
+    """
+    อัปเดต mean/variance ทีละค่า (O(1)) warmup ค่าแรกใช้ Welford (sample variance) หลังจากนั้นเป็น EWMA
+    """
+    if n < warmup:
+        count = n + 1
+        delta = x - mean
+        mean += delta / count
+        m2 = var * (n - 1) if n > 1 else 0.0
+        m2 += delta * (x - mean)
+        return mean, m2 / (count - 1) if count > 1 else 0.0, count
+    diff = x - mean
+    incr = alpha * diff
+    return mean + incr, (1 - alpha) * (var + diff * incr), n + 1
+
+
+def score_bucket(stats: dict, count: int, min_samples: int):
+    """
+    คืนค่า (zScore, std) ของ count เทียบกับสถิติปัจจุบัน หรือ None ถ้ายังไม่ผิดปกติ
+    """
+    if stats["n"] < min_samples:
+        return None
+    std = max(math.sqrt(stats["var"]), MIN_STD)
+    if count - stats["mean"] < MIN_DELTA:
+        return None
+    z = (count - stats["mean"]) / std
+    return (z, std) if z >= Z_THRESHOLD else None
+
+
+def _observe_station(redis_client: Redis, line_id: str, station: str,
+                     granularity: str, buckets: list[tuple[str, int]], current_bucket: str):
+    """
+    ป้อน bucket เรียงตามเวลาให้สถิติของ station เดียว
+
+    bucket ที่ยังเปิดอยู่ (ล่าสุด) จะถูกเทียบกับสถิติแต่ยังไม่ถูกรวมเข้า
+    จะรวมเข้าเมื่อมี bucket ใหม่กว่าเข้ามาแล้วเท่านั้น refresh ซ้ำจึงไม่นับซ้ำ
+    """
+    key = stats_key(line_id, station, granularity)
+    alpha = EWMA_ALPHA[granularity]
+    min_samples = MIN_SAMPLES[granularity]
+    alert = None
+
+    def txn(pipe):
+        nonlocal alert
+        raw = pipe.hgetall(key)
+        stats = {
+            "mean": float(raw.get("mean", 0.0)),
+            "var": float(raw.get("var", 0.0)),
+            "n": int(raw.get("n", 0)),
+            "lastBucket": raw.get("lastBucket", ""),
+            "lastCount": int(raw.get("lastCount", 0)),
+            "alertedBucket": raw.get("alertedBucket", ""),
+        }
+
+        for bucket, count in buckets:
+            if bucket < stats["lastBucket"]:
+                continue
+            if stats["lastBucket"] and bucket > stats["lastBucket"]:
+                # bucket ก่อนหน้าปิดแล้ว รวมค่าสุดท้ายเข้าสถิติ
+                stats["mean"], stats["var"], stats["n"] = ewma_update(
+                    stats["mean"], stats["var"], stats["n"], stats["lastCount"], alpha, min_samples)
+            stats["lastBucket"] = bucket
+            stats["lastCount"] = count
+
+        alert = None
+        # แจ้งเตือนเฉพาะ bucket ที่ยังเปิดอยู่ bucket ที่ปิดไปแล้วใช้สะสมสถิติอย่างเดียว
+        scored = score_bucket(stats, stats["lastCount"], min_samples) if stats["lastBucket"] == current_bucket else None
+        if scored and stats["alertedBucket"] != stats["lastBucket"]:
+            z, std = scored
+            stats["alertedBucket"] = stats["lastBucket"]
+            alert = {
+                "lineId": line_id,
+                "station": station,
+                "granularity": granularity,
+                "bucket": stats["lastBucket"],
+                "count": stats["lastCount"],
+                "mean": round(stats["mean"], 2),
+                "std": round(std, 2),
+                "zScore": round(z, 2),
+                "detectedAt": datetime.now().isoformat(timespec="seconds"),
+            }
+
+        pipe.multi()
+        pipe.hset(key, mapping={k: str(v) for k, v in stats.items()})
+        pipe.expire(key, STATS_TTL_SEC)
+
+    redis_client.transaction(txn, key)
+    return alert
+
+
+def detect_station_anomalies(redis_client: Redis, line_id: str, granularity: str,
+                             rows: list[dict], bucket_field: str, current_bucket: str):
+    """
+    รับ rows ราย bucket (จาก fetch_failures_filter หรือ fetch_failures_hourly)
+    อัปเดตสถิติทุก station และ publish alert ของ station ที่พุ่งผิดปกติใน current_bucket (วัน / ชั่วโมงปัจจุบัน)
+    bucket หลัง current_bucket ไม่ถูกนำมาคิด
+    """
+    rows = sorted((row for row in rows if str(row[bucket_field]) <= current_bucket),
+                  key=lambda row: str(row[bucket_field]))
+    alerts = []
+    for station in STATION_KEYS:
+        buckets = [(str(row[bucket_field]), int(row.get(station, 0))) for row in rows]
+        if not buckets:
+            continue
+        # transaction() จะ retry เองถ้า worker อื่นแก้ key เดียวกันระหว่างนั้น
+        alert = _observe_station(redis_client, line_id, station, granularity, buckets, current_bucket)
+        if alert:
+            alerts.append(alert)
+
+    if alerts:
+        pipe = redis_client.pipeline()
+        for alert in alerts:
+            payload = json.dumps(alert)
+            pipe.publish(ALERT_CHANNEL, payload)
+            pipe.lpush(RECENT_ALERTS_KEY, payload)
+        pipe.ltrim(RECENT_ALERTS_KEY, 0, RECENT_ALERTS_MAX - 1)
+        pipe.execute()
+        logger.warning("anomaly lineId=%s granularity=%s stations=%s",
+                       line_id, granularity, ",".join(a["station"] for a in alerts))
+
+    return alerts
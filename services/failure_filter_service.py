@@ -1,13 +1,17 @@
-from sqlalchemy import text
+from sqlalchemy import bindparam
 from sqlalchemy.orm import Session
-from utils.failure_helpers import calculate_total
-from schemas.failure_schema import FailureStationQuery
+from db.sql_dialect import dialect_text
+from datetime import date
+from utils.failure_helpers import calculate_total, work_date_bounds
+from schemas.failure_schema import FailureStationQuery, FailureLinesQuery
+from utils.metrics import timed_query
 
 
+@timed_query
 def fetch_failures_filter(data: FailureStationQuery, db: Session):
-    query = text("""
+    query = dialect_text(db, """
             SELECT
-                    CAST(DATEADD(MINUTE, -460, DateTime) AS DATE) AS workDate,
+                    {work_date} AS workDate,
                     COUNT( CASE WHEN Station LIKE '%LASH' THEN TrackingNumber END)    AS vflash1,
                     COUNT( CASE WHEN Station LIKE '%IPOT_1' THEN TrackingNumber END) AS hipot1,
                     COUNT( CASE WHEN Station LIKE '%TS1' THEN TrackingNumber END)     AS ats1,
@@ -19,8 +23,8 @@ def fetch_failures_filter(data: FailureStationQuery, db: Session):
                     COUNT( CASE WHEN Station LIKE '%LASH2' THEN TrackingNumber END)   AS vflash2,
                     COUNT( CASE WHEN Station LIKE '%TS3' THEN TrackingNumber END)     AS ats3
             FROM APBM_FailuresPareto
-            WHERE LineID = :lineId AND CAST(DATEADD(MINUTE, -460, DateTime) AS DATE) BETWEEN :startDate AND :endDate
-            GROUP BY CAST(DATEADD(MINUTE, -460, DateTime) AS DATE)
+            WHERE LineID = :lineId AND {work_date} BETWEEN :startDate AND :endDate
+            GROUP BY {work_date}
             ORDER BY workDate ASC;
     """)
 
@@ -35,3 +39,118 @@ def fetch_failures_filter(data: FailureStationQuery, db: Session):
         {**row, "total": calculate_total(row)}
         for row in rows
     ]
+
+
+@timed_query
+def fetch_failures_filter_lines(data: FailureLinesQuery, db: Session):
+    """
+    สรุป fail ราย station ของหลาย line ใน query เดียว (GROUP BY LineID, workDate)
+    lineIds = None หมายถึงทุก line
+    """
+    line_filter = "LineID IN :lineIds AND" if data.lineIds else ""
+    query = dialect_text(db, """
+            SELECT
+                    LineID AS lineId,
+                    {work_date} AS workDate,
+                    COUNT( CASE WHEN Station LIKE '%LASH' THEN TrackingNumber END)    AS vflash1,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_1' THEN TrackingNumber END) AS hipot1,
+                    COUNT( CASE WHEN Station LIKE '%TS1' THEN TrackingNumber END)     AS ats1,
+                    COUNT( CASE WHEN Station LIKE '%EATUP' THEN TrackingNumber END)  AS heatup,
+                    COUNT( CASE WHEN Station LIKE '%RATION' THEN TrackingNumber END) AS vibration,
+                    COUNT( CASE WHEN Station LIKE '%RN_IN' THEN TrackingNumber END)  AS burnin,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_2' THEN TrackingNumber END) AS hipot2,
+                    COUNT( CASE WHEN Station LIKE '%TS2' THEN TrackingNumber END)     AS ats2,
+                    COUNT( CASE WHEN Station LIKE '%LASH2' THEN TrackingNumber END)   AS vflash2,
+                    COUNT( CASE WHEN Station LIKE '%TS3' THEN TrackingNumber END)     AS ats3
+            FROM APBM_FailuresPareto
+            WHERE {line_filter} DateTime >= :startTs AND DateTime < :endTs
+            GROUP BY LineID, {work_date}
+            ORDER BY lineId ASC, workDate ASC;
+    """, line_filter=line_filter)
+    params = {}
+    if data.lineIds:
+        query = query.bindparams(bindparam("lineIds", expanding=True))
+        params["lineIds"] = data.lineIds
+
+    start_ts, end_ts = work_date_bounds(data.startDate, data.endDate)
+    result = db.execute(query, {**params, "startTs": start_ts, "endTs": end_ts})
+
+    by_line = {line_id: [] for line_id in data.lineIds or []}
+    for row in result:
+        row = dict(row._mapping)
+        # LineID ในตารางบางแถวมี space ต่อท้าย (CHAR)
+        line_id = row.pop("lineId").strip()
+        by_line.setdefault(line_id, []).append({**row, "total": calculate_total(row)})
+    return by_line
+
+
+@timed_query
+def fetch_failures_hourly(line_id: str, work_date: date, db: Session):
+    """
+    สรุป fail ราย station แยกตามชั่วโมงของวันทำงาน (workHour 0 = 07:40-08:40)
+    """
+    query = dialect_text(db, """
+            SELECT
+                    {work_hour} AS workHour,
+                    COUNT( CASE WHEN Station LIKE '%LASH' THEN TrackingNumber END)    AS vflash1,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_1' THEN TrackingNumber END) AS hipot1,
+                    COUNT( CASE WHEN Station LIKE '%TS1' THEN TrackingNumber END)     AS ats1,
+                    COUNT( CASE WHEN Station LIKE '%EATUP' THEN TrackingNumber END)  AS heatup,
+                    COUNT( CASE WHEN Station LIKE '%RATION' THEN TrackingNumber END) AS vibration,
+                    COUNT( CASE WHEN Station LIKE '%RN_IN' THEN TrackingNumber END)  AS burnin,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_2' THEN TrackingNumber END) AS hipot2,
+                    COUNT( CASE WHEN Station LIKE '%TS2' THEN TrackingNumber END)     AS ats2,
+                    COUNT( CASE WHEN Station LIKE '%LASH2' THEN TrackingNumber END)   AS vflash2,
+                    COUNT( CASE WHEN Station LIKE '%TS3' THEN TrackingNumber END)     AS ats3
+            FROM APBM_FailuresPareto
+            WHERE LineID = :lineId AND DateTime >= :startTs AND DateTime < :endTs
+            GROUP BY {work_hour}
+            ORDER BY workHour ASC;
+    """)
+
+    start_ts, end_ts = work_date_bounds(work_date, work_date)
+    result = db.execute(query, {"lineId": line_id, "startTs": start_ts, "endTs": end_ts})
+
+    return [dict(row._mapping) for row in result]
+
+
+@timed_query
+def fetch_failures_hourly_lines(line_ids: list[str] | None, work_date: date, db: Session):
+    """
+    fetch_failures_hourly ของหลาย line ใน query เดียว (GROUP BY LineID, workHour) ใช้ตอน refresh overview
+    line_ids = None หมายถึงทุก line
+    """
+    line_filter = "LineID IN :lineIds AND" if line_ids else ""
+    query = dialect_text(db, """
+            SELECT
+                    LineID AS lineId,
+                    {work_hour} AS workHour,
+                    COUNT( CASE WHEN Station LIKE '%LASH' THEN TrackingNumber END)    AS vflash1,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_1' THEN TrackingNumber END) AS hipot1,
+                    COUNT( CASE WHEN Station LIKE '%TS1' THEN TrackingNumber END)     AS ats1,
+                    COUNT( CASE WHEN Station LIKE '%EATUP' THEN TrackingNumber END)  AS heatup,
+                    COUNT( CASE WHEN Station LIKE '%RATION' THEN TrackingNumber END) AS vibration,
+                    COUNT( CASE WHEN Station LIKE '%RN_IN' THEN TrackingNumber END)  AS burnin,
+                    COUNT( CASE WHEN Station LIKE '%IPOT_2' THEN TrackingNumber END) AS hipot2,
+                    COUNT( CASE WHEN Station LIKE '%TS2' THEN TrackingNumber END)     AS ats2,
+                    COUNT( CASE WHEN Station LIKE '%LASH2' THEN TrackingNumber END)   AS vflash2,
+                    COUNT( CASE WHEN Station LIKE '%TS3' THEN TrackingNumber END)     AS ats3
+            FROM APBM_FailuresPareto
+            WHERE {line_filter} DateTime >= :startTs AND DateTime < :endTs
+            GROUP BY LineID, {work_hour}
+            ORDER BY lineId ASC, workHour ASC;
+    """, line_filter=line_filter)
+    params = {}
+    if line_ids:
+        query = query.bindparams(bindparam("lineIds", expanding=True))
+        params["lineIds"] = line_ids
+
+    start_ts, end_ts = work_date_bounds(work_date, work_date)
+    result = db.execute(query, {**params, "startTs": start_ts, "endTs": end_ts})
+
+    by_line = {line_id: [] for line_id in line_ids or []}
+    for row in result:
+        row = dict(row._mapping)
+        # LineID ในตารางบางแถวมี space ต่อท้าย (CHAR)
+        by_line.setdefault(row.pop("lineId").strip(), []).append(row)
+    return by_line
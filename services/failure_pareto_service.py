@@ -0,0 +1,115 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+from db.sql_dialect import dialect_text
+from utils.failure_helpers import WORKDAY_OFFSET_MINUTES, work_date_bounds
+from utils.metrics import timed_query
+
+PARETO_DIMENSIONS = ("failItem", "testerId", "fixtureId")
+
+# กะเช้า = 12 ชั่วโมงแรกของวันทำงาน (07:40-19:40), ที่เหลือเป็นกะดึก
+SHIFT_HOURS = 12
+
+
+@timed_query
+def fetch_pareto_counts(line_id: str, start_date: date, end_date: date, db: Session):
+    """
+    ดึงจำนวน fail ที่ group แล้วใน SQL (workDate, ชั่วโมงของวันทำงาน, failItem, tester, fixture)
+    แทนการดึงทุกแถวมานับใน Python
+    """
+    query = dialect_text(db, """
+        SELECT {work_date} AS workDate,
+               {work_hour} AS workHour,
+               {fail_item} AS failItem,
+               TesterID AS testerId,
+               FixtureID AS fixtureId,
+               COUNT(TrackingNumber) AS failCount
+        FROM APBM_FailuresPareto
+        WHERE LineID = :lineId AND DateTime >= :startTs AND DateTime < :endTs
+        GROUP BY {work_date},
+                 {work_hour},
+                 {fail_item},
+                 TesterID, FixtureID;
+        """)
+
+    start_ts, end_ts = work_date_bounds(start_date, end_date)
+    result = db.execute(query, {
+        "lineId": line_id,
+        "startTs": start_ts,
+        "endTs": end_ts})
+
+    return [
+        {**row, "workDate": str(row["workDate"])}
+        for row in (dict(r._mapping) for r in result)
+    ]
+
+
+def bucket_label(row: dict, bucket: str) -> str:
+    if bucket == "day":
+        return row["workDate"]
+    if bucket == "shift":
+        shift = "DAY" if row["workHour"] < SHIFT_HOURS else "NIGHT"
+        return f"{row['workDate']} {shift}"
+    if bucket == "hour":
+        # แสดงเป็นเวลาจริงที่ชั่วโมงนั้นเริ่ม เช่น 2025-09-05 07:40
+        start = datetime.fromisoformat(row["workDate"]) + timedelta(
+            minutes=WORKDAY_OFFSET_MINUTES, hours=row["workHour"])
+        return start.strftime("%Y-%m-%d %H:%M")
+    return "all"
+
+
+def rank_pareto(counter: Counter, top: int | None = None):
+    total = sum(counter.values())
+    ranked = sorted(counter.items(), key=lambda kv: (-kv[1], kv[0]))
+    if top:
+        ranked = ranked[:top]
+
+    items = []
+    running = 0
+    for key, count in ranked:
+        running += count
+        items.append({
+            "key": key,
+            "count": count,
+            "percent": round(count * 100 / total, 2) if total else 0.0,
+            "cumulativePercent": round(running * 100 / total, 2) if total else 0.0,
+        })
+    return items
+
+
+def build_pareto_set(counters: dict, total: int, top: int | None = None):
+    return {
+        "total": total,
+        **{dim: rank_pareto(counters[dim], top) for dim in PARETO_DIMENSIONS}
+    }
+
+
+def build_pareto(rows: list[dict], bucket: str = "none", top: int | None = None):
+    """
+    รวม rows จาก fetch_pareto_counts เป็น Pareto ที่เรียงอันดับแล้ว พร้อม % สะสม
+    ทั้งภาพรวม และแยกตาม bucket (hour / shift / day)
+    """
+    overall = {dim: Counter() for dim in PARETO_DIMENSIONS}
+    overall_total = 0
+    per_bucket = defaultdict(lambda: {dim: Counter() for dim in PARETO_DIMENSIONS})
+    bucket_totals = Counter()
+
+    for row in rows:
+        count = row["failCount"]
+        overall_total += count
+        label = bucket_label(row, bucket) if bucket != "none" else None
+        if label:
+            bucket_totals[label] += count
+        for dim in PARETO_DIMENSIONS:
+            key = row[dim] or "UNKNOWN"
+            overall[dim][key] += count
+            if label:
+                per_bucket[label][dim][key] += count
+
+    return {
+        "overall": build_pareto_set(overall, overall_total, top),
+        "buckets": [
+            {"bucket": label, **build_pareto_set(per_bucket[label], bucket_totals[label], top)}
+            for label in sorted(per_bucket)
+        ],
+    }
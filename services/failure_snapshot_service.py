@@ -0,0 +1,251 @@
+"""
+summary / pareto ของวันที่ปิดแล้วอ่านจาก snapshot (db/snapshot_store.py) แทน SQL Server
+
+- export_closed_days(): ดึงวันที่ปิดแล้วที่ยังไม่อยู่ใน snapshot ทีละช่วง (WHERE DateTime ใช้ index ได้,
+  group + แยก FailItem ใน SQL ครั้งเดียวตอน export) แล้วเขียนเป็นไฟล์ราย line / วัน
+  วันที่ export แล้วใน SNAPSHOT_RECHECK_DAYS วันล่าสุดถูกเทียบจำนวน fail กับ DB ทุกรอบ ไม่ตรง = export ใหม่
+- split_snapshot_range(): แบ่งช่วงวันที่ของ request เป็นส่วนที่อ่านจาก snapshot กับส่วนที่ต้องยิง DB
+  (วันนี้ และวันที่ยังไม่ export)
+- snapshot_*(): ผลรูปแบบเดียวกับ fetch_* ใน failure_filter_service / failure_pareto_service
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+from db.config import (SNAPSHOT_BACKFILL_DAYS, SNAPSHOT_EXPORT_BATCH_DAYS, SNAPSHOT_EXPORT_INTERVAL_SEC,
+                       SNAPSHOT_RECHECK_DAYS, SNAPSHOT_SETTLE_MINUTES)
+from db.redis_client import r as redis_client
+from db.session import ExportSessionLocal
+from db.snapshot_store import day_range, snapshot_store
+from db.sql_dialect import dialect_text
+from utils.failure_helpers import STATION_KEYS, calculate_total, current_work_date, work_date_bounds
+from utils.metrics import (SNAPSHOT_DAYS_READ, SNAPSHOT_EXPORT_FAILURES, SNAPSHOT_EXPORTED_DAYS, SNAPSHOT_READ_SECONDS,
+                           timed_query)
+from utils.redis_lease import hold_lease
+
+logger = logging.getLogger(__name__)
+
+# pattern เดียวกับ COUNT(CASE WHEN Station LIKE ...) ใน failure_filter_service
+STATION_KEY_SQL = """CASE WHEN Station LIKE '%LASH' THEN 'vflash1'
+                    WHEN Station LIKE '%IPOT_1' THEN 'hipot1'
+                    WHEN Station LIKE '%TS1' THEN 'ats1'
+                    WHEN Station LIKE '%EATUP' THEN 'heatup'
+                    WHEN Station LIKE '%RATION' THEN 'vibration'
+                    WHEN Station LIKE '%RN_IN' THEN 'burnin'
+                    WHEN Station LIKE '%IPOT_2' THEN 'hipot2'
+                    WHEN Station LIKE '%TS2' THEN 'ats2'
+                    WHEN Station LIKE '%LASH2' THEN 'vflash2'
+                    WHEN Station LIKE '%TS3' THEN 'ats3' END"""
+
+# export ทีละ host (ไฟล์อยู่บน disk ของเครื่อง) worker อื่นในเครื่องเดียวกันรอรับช่วงเมื่อ lease หมดอายุ
+EXPORT_LEASE_KEY = f"failures:snapshot:export:{socket.gethostname()}"
+EXPORT_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+EXPORT_LEASE_TTL_MS = int(SNAPSHOT_EXPORT_INTERVAL_SEC * 2 * 1000)
+
+
+@timed_query(breaker=None)
+def fetch_snapshot_counts(start_date: date, end_date: date, db: Session):
+    """
+    จำนวน fail ของทุก line ในช่วง workDate ที่ group ตาม column ของ snapshot แล้ว
+    """
+    query = dialect_text(db, """
+        SELECT LineID AS lineId,
+               {work_date} AS workDate,
+               {work_hour} AS workHour,
+               {station_key} AS stationKey,
+               {fail_item} AS failItem,
+               TesterID AS testerId,
+               FixtureID AS fixtureId,
+               COUNT(TrackingNumber) AS failCount
+        FROM APBM_FailuresPareto
+        WHERE DateTime >= :startTs AND DateTime < :endTs
+        GROUP BY LineID, {work_date}, {work_hour}, {station_key}, {fail_item}, TesterID, FixtureID;
+        """, station_key=STATION_KEY_SQL)
+
+    start_ts, end_ts = work_date_bounds(start_date, end_date)
+    result = db.execute(query, {"startTs": start_ts, "endTs": end_ts})
+
+    rows = []
+    for row in result:
+        row = dict(row._mapping)
+        # LineID ในตารางบางแถวมี space ต่อท้าย (CHAR), SQLite คืน workDate เป็น string
+        row["lineId"] = (row["lineId"] or "").strip()
+        row["workDate"] = date.fromisoformat(str(row["workDate"])[:10])
+        rows.append(row)
+    return rows
+
+
+@timed_query(breaker=None)
+def fetch_snapshot_day_totals(start_date: date, end_date: date, db: Session):
+    """
+    จำนวน fail รวมรายวันทำงาน (ทุก line) เท่ากับผลรวม failCount ของ fetch_snapshot_counts วันเดียวกัน
+    """
+    query = dialect_text(db, """
+        SELECT {work_date} AS workDate,
+               COUNT(TrackingNumber) AS failCount
+        FROM APBM_FailuresPareto
+        WHERE DateTime >= :startTs AND DateTime < :endTs
+        GROUP BY {work_date};
+        """)
+
+    start_ts, end_ts = work_date_bounds(start_date, end_date)
+    result = db.execute(query, {"startTs": start_ts, "endTs": end_ts})
+    return [{"workDate": date.fromisoformat(str(row.workDate)[:10]), "failCount": row.failCount} for row in result]
+
+
+def last_closed_day(now: datetime | None = None) -> date:
+    now = now or datetime.now()
+    return current_work_date(now - timedelta(minutes=SNAPSHOT_SETTLE_MINUTES)) - timedelta(days=1)
+
+
+def _export_batches(missing: list[date]) -> list[list[date]]:
+    # ช่วงวันติดกันไม่เกิน SNAPSHOT_EXPORT_BATCH_DAYS ต่อ query ใหม่สุดก่อน (ช่วงที่คนดูบ่อยได้ก่อน)
+    batches = []
+    for day in sorted(missing, reverse=True):
+        if batches and len(batches[-1]) < SNAPSHOT_EXPORT_BATCH_DAYS and batches[-1][-1] - day == timedelta(days=1):
+            batches[-1].append(day)
+        else:
+            batches.append([day])
+    return batches
+
+
+def export_closed_days(now: datetime | None = None) -> int:
+    """
+    export วันทำงานที่ปิดแล้ว (ย้อนหลัง SNAPSHOT_BACKFILL_DAYS) ที่ยังไม่มีใน snapshot คืนจำนวนวันที่ export
+    """
+    if not snapshot_store.available:
+        return 0
+    end_date = last_closed_day(now)
+    start_date = end_date - timedelta(days=SNAPSHOT_BACKFILL_DAYS - 1)
+    exported = 0
+    pending = set(snapshot_store.missing_days(start_date, end_date)) | _changed_days(start_date, end_date)
+    for days in _export_batches(sorted(pending)):
+        # backfill ครั้งแรกนานกว่า EXPORT_LEASE_TTL_MS ได้ ต่อ lease ก่อนทุก batch
+        # เสีย lease ไปแล้ว (worker อื่นรับช่วง) = หยุด ไม่ export วันเดียวกันซ้ำ
+        if not _hold_export_lease():
+            logger.warning("snapshot export lease lost, stopping after days=%d", exported)
+            break
+        try:
+            with ExportSessionLocal() as db:
+                rows = fetch_snapshot_counts(min(days), max(days), db)
+            snapshot_store.write_days(days, rows)
+        except Exception:
+            # batch ที่ล้ม (เช่น timeout) ไม่บล็อกวันที่เก่ากว่า รอบหน้าค่อยลองใหม่
+            SNAPSHOT_EXPORT_FAILURES.inc()
+            logger.exception("snapshot export failed days=%s..%s", min(days), max(days))
+            continue
+        SNAPSHOT_EXPORTED_DAYS.inc(len(days))
+        exported += len(days)
+    return exported
+
+
+def _changed_days(start_date: date, end_date: date) -> set[date]:
+    """
+    วันที่ export แล้วใน SNAPSHOT_RECHECK_DAYS วันล่าสุดที่จำนวน fail ใน DB ไม่ตรงกับตอน export
+    (แถวที่ upload มาหลัง SNAPSHOT_SETTLE_MINUTES รวมถึงวันที่ export ไปตอนยังว่าง)
+    """
+    recheck_start = max(start_date, end_date - timedelta(days=SNAPSHOT_RECHECK_DAYS - 1))
+    if recheck_start > end_date:
+        return set()
+    exported = snapshot_store.exported_counts(day_range(recheck_start, end_date))
+    if not exported:
+        return set()
+    try:
+        with ExportSessionLocal() as db:
+            rows = fetch_snapshot_day_totals(min(exported), max(exported), db)
+    except Exception:
+        # เช็คไม่ได้รอบนี้ export เฉพาะวันที่ยังไม่มี รอบหน้าค่อยเช็คใหม่
+        SNAPSHOT_EXPORT_FAILURES.inc()
+        logger.exception("snapshot recheck failed days=%s..%s", min(exported), max(exported))
+        return set()
+    totals = {row["workDate"]: row["failCount"] for row in rows}
+    changed = {day for day, count in exported.items() if count != totals.get(day, 0)}
+    if changed:
+        logger.info("snapshot days changed since export, re-exporting days=%s",
+                    ",".join(str(day) for day in sorted(changed)))
+    return changed
+
+
+def _hold_export_lease() -> bool:
+    try:
+        return hold_lease(redis_client, EXPORT_LEASE_KEY, EXPORT_OWNER, EXPORT_LEASE_TTL_MS)
+    except Exception as e:
+        # Redis ล่ม: export ต่อได้ (เขียนไฟล์แบบ atomic ซ้ำกันได้ แค่เสียงาน)
+        logger.warning("snapshot export lease unavailable: %r", e)
+        return True
+
+
+async def run_snapshot_exporter():
+    """
+    งานเบื้องหลังใน lifespan: ทุก SNAPSHOT_EXPORT_INTERVAL_SEC เช็คแล้ว export วันที่ปิดไปแล้ว
+    """
+    if not snapshot_store.available:
+        logger.info("snapshot disabled (SNAPSHOT_ENABLED=false or pyarrow not installed)")
+        return
+    while True:
+        try:
+            if await asyncio.to_thread(_hold_export_lease):
+                exported = await asyncio.to_thread(export_closed_days)
+                if exported:
+                    logger.info("snapshot export finished days=%d", exported)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Redis / disk มีปัญหา: รอบหน้าลองใหม่ วันที่ยังไม่ export ก็ยังยิง DB ได้ตามปกติ
+            logger.exception("snapshot export failed")
+        await asyncio.sleep(SNAPSHOT_EXPORT_INTERVAL_SEC)
+
+
+def split_snapshot_range(start_date: date, end_date: date, namespace: str):
+    """
+    คืน (snapshot_end, db_start): อ่าน snapshot ช่วง start_date..snapshot_end และยิง DB ช่วง db_start..end_date
+    ส่วนที่ไม่มีเป็น None
+    """
+    snapshot_end = snapshot_store.covered_until(start_date, end_date)
+    if snapshot_end is None:
+        SNAPSHOT_DAYS_READ.inc((end_date - start_date).days + 1, namespace=namespace, source="db")
+        return None, start_date
+    SNAPSHOT_DAYS_READ.inc((snapshot_end - start_date).days + 1, namespace=namespace, source="snapshot")
+    if snapshot_end >= end_date:
+        return snapshot_end, None
+    SNAPSHOT_DAYS_READ.inc((end_date - snapshot_end).days, namespace=namespace, source="db")
+    return snapshot_end, snapshot_end + timedelta(days=1)
+
+
+def _station_rows(table) -> list[dict]:
+    # วันที่มีแต่ station ที่ไม่ตรง pattern ไหนเลย ก็ได้แถว (ค่า 0 ทั้งหมด) เหมือน GROUP BY ใน SQL
+    by_day = {}
+    for item in table.group_by(["workDate", "stationKey"]).aggregate([("failCount", "sum")]).to_pylist():
+        row = by_day.setdefault(item["workDate"], {"workDate": item["workDate"], **{key: 0 for key in STATION_KEYS}})
+        if item["stationKey"]:
+            row[item["stationKey"]] = item["failCount_sum"]
+    return [{**row, "total": calculate_total(row)} for _, row in sorted(by_day.items())]
+
+
+def snapshot_failures_filter(line_id: str, start_date: date, end_date: date) -> list[dict]:
+    with SNAPSHOT_READ_SECONDS.time(function="snapshot_failures_filter"):
+        table = snapshot_store.read(line_id, start_date, end_date, ["workDate", "stationKey", "failCount"])
+        return _station_rows(table)
+
+
+def snapshot_failures_filter_lines(line_ids: list[str] | None, start_date: date, end_date: date) -> dict:
+    with SNAPSHOT_READ_SECONDS.time(function="snapshot_failures_filter_lines"):
+        by_line = {}
+        for line_id in line_ids or snapshot_store.lines():
+            table = snapshot_store.read(line_id, start_date, end_date, ["workDate", "stationKey", "failCount"])
+            if line_ids or table.num_rows:
+                by_line[line_id] = _station_rows(table)
+        return by_line
+
+
+def snapshot_pareto_counts(line_id: str, start_date: date, end_date: date) -> list[dict]:
+    with SNAPSHOT_READ_SECONDS.time(function="snapshot_pareto_counts"):
+        keys = ["workDate", "workHour", "failItem", "testerId", "fixtureId"]
+        table = snapshot_store.read(line_id, start_date, end_date, [*keys, "failCount"])
+        return [
+            {**{key: item[key] for key in keys}, "workDate": item["workDate"].isoformat(),
+             "failCount": item["failCount_sum"]}
+            for item in table.group_by(keys).aggregate([("failCount", "sum")]).to_pylist()
+        ]
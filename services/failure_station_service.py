@@ -1,23 +1,23 @@
-from sqlalchemy import text
 from sqlalchemy.orm import Session
+from db.sql_dialect import dialect_text
 from schemas.failure_schema import FailureStation
+from utils.metrics import timed_query
 
+@timed_query
 def fetch_failure_station(data:FailureStation,db: Session):
     work_date = data.workDate
     if not work_date:
         from datetime import datetime
         work_date = datetime.now().strftime("%Y-%m-%d")
-    query = text("""
+    query = dialect_text(db, """
         SELECT Trackingnumber AS sn,
                TesterID AS testerId,
                FGpartnumber AS model,
                FixtureID AS fixtureId,
-               CASE WHEN CHARINDEX(')', FailItem) > 0 AND CHARINDEX('}', FailItem) > 0
-                    THEN SUBSTRING(FailItem,CHARINDEX(')', FailItem) + 1,
-                    CHARINDEX('}', FailItem) - CHARINDEX(')', FailItem) - 1) ELSE NULL END AS failItem,
-                    CONVERT(VARCHAR, DateTime, 120) AS workDate
+               {fail_item} AS failItem,
+               {date_time_text} AS workDate
         FROM APBM_FailuresPareto
-        WHERE LineID = :lineId AND CAST(DATEADD(MINUTE, -460, DateTime) AS DATE) = :workDate
+        WHERE LineID = :lineId AND {work_date} = :workDate
         GROUP BY TesterID,FixtureID, FailItem, DateTime, Trackingnumber, FGpartnumber
         HAVING COUNT(DISTINCT CASE WHEN Station LIKE :station THEN TrackingNumber END) > 0
         ORDER BY workDate ASC;
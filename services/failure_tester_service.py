@@ -1,19 +1,19 @@
-from sqlalchemy import text
 from sqlalchemy.orm import Session
+from db.sql_dialect import dialect_text
 from schemas.failure_schema import FailureTester
+from utils.metrics import timed_query
 
+@timed_query
 def fetch_failure_tester(data:FailureTester,db: Session):
-    query = text("""
+    query = dialect_text(db, """
         SELECT Trackingnumber AS sn,
                 FGpartnumber AS model,
                TesterID AS testerId,
                FixtureID AS fixtureId,
-               CASE WHEN CHARINDEX(')', FailItem) > 0 AND CHARINDEX('}', FailItem) > 0
-                    THEN SUBSTRING(FailItem,CHARINDEX(')', FailItem) + 1,
-                    CHARINDEX('}', FailItem) - CHARINDEX(')', FailItem) - 1) ELSE NULL END AS failItem,
-                    CONVERT(VARCHAR, DateTime, 120) AS workDate
+               {fail_item} AS failItem,
+               {date_time_text} AS workDate
         FROM APBM_FailuresPareto
-        WHERE LineID = :lineId AND CAST(DATEADD(MINUTE, -460, DateTime) AS DATE) BETWEEN :startDate AND :endDate
+        WHERE LineID = :lineId AND {work_date} BETWEEN :startDate AND :endDate
         GROUP BY TesterID,FixtureID, FailItem, DateTime, Trackingnumber,FGpartnumber
         HAVING :station IS NULL OR COUNT(DISTINCT CASE WHEN Station LIKE :station THEN TrackingNumber END) > 0
 ORDER BY workDate ASC;
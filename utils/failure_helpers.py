@@ -1,7 +1,60 @@
+from datetime import date, datetime, timedelta
+
+# วันทำงานเริ่ม 07:40 (เลื่อนเวลา 460 นาที เหมือนใน query ของ services/)
+WORKDAY_OFFSET_MINUTES = 460
+
+STATION_KEYS = [
+    "vflash1", "hipot1", "ats1","vibration",
+    "heatup", "burnin", "hipot2",
+    "ats2","vflash2", "ats3"
+]
+
+
 def calculate_total(row: dict) -> int:
-    stations = [
-        "vflash1", "hipot1", "ats1","vibration",
-        "heatup", "burnin", "hipot2",
-        "ats2","vflash2", "ats3"
-    ]
-    return sum(row.get(station, 0) for station in stations)
\ No newline at end of file
+    return sum(row.get(station, 0) for station in STATION_KEYS)
+
+
+def current_work_date(now: datetime | None = None) -> date:
+    """
+    คืนค่า workDate ปัจจุบัน (วันทำงานที่ยังไม่ปิด)
+    """
+    now = now or datetime.now()
+    return (now - timedelta(minutes=WORKDAY_OFFSET_MINUTES)).date()
+
+
+def current_work_hour(now: datetime | None = None) -> int:
+    """
+    ชั่วโมงที่เท่าไรของวันทำงานปัจจุบัน (0 = 07:40-08:40)
+    """
+    now = now or datetime.now()
+    return (now - timedelta(minutes=WORKDAY_OFFSET_MINUTES)).hour
+
+
+def work_date_bounds(start_date: date, end_date: date) -> tuple[datetime, datetime]:
+    """
+    แปลงช่วง workDate เป็นช่วงเวลาจริง [start, end) เพื่อให้ WHERE DateTime ใช้ index ได้
+    """
+    offset = timedelta(minutes=WORKDAY_OFFSET_MINUTES)
+    start_ts = datetime.combine(start_date, datetime.min.time()) + offset
+    end_ts = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) + offset
+    return start_ts, end_ts
+
+
+def contiguous_runs(days: list[date]) -> list[tuple[date, date]]:
+    """
+    รวมวันที่ (เรียงแล้ว) เป็นช่วงติดกัน [(start, end), ...] ให้ query แต่ละช่วงไม่ทับวันที่มีอยู่แล้ว
+    """
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def parse_date_param(value: str | None) -> date:
+    """
+    แปลง "YYYY-MM-DD" จาก query string / params ของ socket (ไม่ส่งมา = วันนี้)
+    """
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else datetime.today().date()
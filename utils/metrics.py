@@ -0,0 +1,201 @@
+"""
+Metrics แบบ Prometheus text format (เก็บใน process, ไม่ต้องพึ่ง prometheus_client)
+อ่านค่าได้ที่ GET /metrics
+"""
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from db.circuit_breaker import CircuitBreaker, CircuitOpenError, read_breaker
+from db.query_profiler import query_context, set_row_count
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted((k, {**v, "counts": list(v["counts"])}) for k, v in self._values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                labels = _format_labels(self.label_names, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {state['sum']}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CACHE_REQUESTS = Counter("dashboard_cache_requests_total", "Redis cache lookups", ("namespace", "result"))
+DB_QUERY_SECONDS = Histogram("dashboard_db_query_seconds", "DB query latency per service function", ("function",))
+DB_QUERY_ROWS = Histogram("dashboard_db_query_rows", "Rows returned per service function", ("function",),
+                          buckets=(0, 10, 100, 1_000, 10_000, 100_000))
+WS_PAYLOAD_BYTES = Histogram("dashboard_ws_payload_bytes", "WebSocket payload size", ("endpoint",),
+                             buckets=SIZE_BUCKETS)
+WS_SEND_SECONDS = Histogram("dashboard_ws_send_seconds", "WebSocket send latency", ("endpoint",))
+WS_ACTIVE = Gauge("dashboard_ws_active_subscribers", "Connected WebSocket clients", ("endpoint",))
+WS_DROPPED = Counter("dashboard_ws_dropped_messages_total", "Queued payloads dropped or coalesced", ("endpoint",))
+WS_EVICTED = Counter("dashboard_ws_evictions_total", "Connections closed by the server", ("endpoint", "reason"))
+WS_FEEDS = Gauge("dashboard_ws_feeds", "Shared refresh tasks (one per distinct subscription)", ("type",))
+FEED_REFRESHES = Counter("dashboard_feed_refreshes_total", "Feed loads run by this worker (lease owner)", ("type",))
+FEED_RELAYED = Counter("dashboard_feed_relayed_total", "Feed payloads relayed from another worker", ("type",))
+DB_CIRCUIT_OPEN = Gauge("dashboard_db_circuit_open", "1 while the DB circuit breaker rejects queries", ("breaker",))
+DB_CIRCUIT_REJECTED = Counter("dashboard_db_circuit_rejected_total", "Queries rejected by an open circuit", ("function",))
+SNAPSHOT_READ_SECONDS = Histogram("dashboard_snapshot_read_seconds", "Parquet snapshot read latency", ("function",))
+SNAPSHOT_DAYS_READ = Counter("dashboard_snapshot_days_total", "Work days served from the snapshot vs the DB",
+                             ("namespace", "source"))
+SNAPSHOT_EXPORTED_DAYS = Counter("dashboard_snapshot_exported_days_total", "Closed work days written to the snapshot")
+SNAPSHOT_EXPORT_FAILURES = Counter("dashboard_snapshot_export_failures_total", "Snapshot export batches that failed")
+EVENT_LOOP_LAG = Histogram("dashboard_event_loop_lag_seconds", "Event loop scheduling lag",
+                           buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+EVENT_LOOP_PROBE_SEC = 0.5
+
+
+def observe_cache(namespace: str, hit: bool):
+    CACHE_REQUESTS.inc(namespace=namespace, result="hit" if hit else "miss")
+
+
+def timed_query(func=None, *, breaker: CircuitBreaker | None = read_breaker):
+    """
+    decorator สำหรับ service function: จับเวลา query และจำนวนแถวที่ได้
+    ผ่าน circuit breaker ของ read pool ด้วย (วงจรเปิด = CircuitOpenError ทันที ไม่ยิง DB)
+    งานเบื้องหลังที่มี engine / timeout ของตัวเอง (เช่น export snapshot) ใช้ @timed_query(breaker=None)
+    เพื่อไม่ให้ query ที่ช้าของมันเปิดวงจรของ dashboard
+    """
+    if func is None:
+        return functools.partial(timed_query, breaker=breaker)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            with breaker.guard() if breaker else nullcontext(), query_context(func.__name__) as records, \
+                    DB_QUERY_SECONDS.time(function=func.__name__):
+                result = func(*args, **kwargs)
+        except CircuitOpenError:
+            DB_CIRCUIT_REJECTED.inc(function=func.__name__)
+            raise
+        finally:
+            if breaker:
+                DB_CIRCUIT_OPEN.set(int(breaker.state != "closed"), breaker=breaker.name)
+        if isinstance(result, dict):
+            rows = sum(len(v) for v in result.values())
+        elif isinstance(result, list):
+            rows = len(result)
+        else:
+            return result
+        DB_QUERY_ROWS.observe(rows, function=func.__name__)
+        set_row_count(records, rows)
+        return result
+
+    return wrapper
+
+
+async def monitor_event_loop_lag():
+    """
+    sleep เป็นช่วงสั้น ๆ แล้ววัดว่าตื่นช้ากว่าที่ควรเท่าไร (= loop ถูก block)
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_PROBE_SEC)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - EVENT_LOOP_PROBE_SEC))
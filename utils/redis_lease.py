@@ -0,0 +1,36 @@
+"""
+lease (lock ที่หมดอายุเองได้) บน Redis สำหรับเลือก worker เดียวให้ทำงานหนึ่งอย่าง
+
+owner ต้อง hold_lease() ซ้ำก่อน ttl หมด ถ้า worker ตายไป lease จะหมดอายุแล้ว worker อื่นรับช่วงต่อ
+"""
+from redis import Redis
+
+
+def hold_lease(redis_client: Redis, key: str, owner: str, ttl_ms: int) -> bool:
+    """
+    ได้ lease ใหม่ หรือต่ออายุ lease ที่ถืออยู่แล้ว คืน False ถ้ามี owner อื่นถืออยู่
+    """
+    def txn(pipe):
+        current = pipe.get(key)
+        if current is not None and current != owner:
+            return False
+        pipe.multi()
+        pipe.set(key, owner, px=ttl_ms)
+        return True
+
+    # WATCH key: ถ้า worker อื่นแย่งระหว่างนั้น transaction() จะ retry แล้วเห็น owner ใหม่
+    return redis_client.transaction(txn, key, value_from_callable=True)
+
+
+def release_lease(redis_client: Redis, key: str, owner: str) -> bool:
+    """
+    ปล่อย lease ทันที (ลบเฉพาะถ้ายังเป็นของเรา) ให้ worker อื่นรับช่วงได้โดยไม่ต้องรอหมดอายุ
+    """
+    def txn(pipe):
+        if pipe.get(key) != owner:
+            return False
+        pipe.multi()
+        pipe.delete(key)
+        return True
+
+    return redis_client.transaction(txn, key, value_from_callable=True)
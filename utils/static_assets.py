@@ -0,0 +1,232 @@
+"""
+เสิร์ฟไฟล์ใน templates/ จาก memory แทน StaticFiles
+
+- อ่านทุกไฟล์ครั้งเดียวตอน startup (lifespan เรียก load()) บีบอัด gzip / brotli ไว้ล่วงหน้า
+  (brotli ใช้เมื่อติดตั้ง `pip install brotli` ไม่มีก็ส่ง gzip)
+- ETag แบบ strong จาก sha256 ของเนื้อไฟล์ ตอบ 304 ให้ If-None-Match / If-Modified-Since
+- ไฟล์ที่มี version (ชื่อมี hash เช่น chart.umd.3f9a1c2e.js หรือเรียกด้วย ?v=<hash> ที่ตรงกับไฟล์)
+  cache ได้ 1 ปีแบบ immutable, HTML ให้ revalidate ทุกครั้ง (ได้ของใหม่ทันทีหลัง deploy แต่ส่งแค่ 304)
+- ตอนโหลด src="..." / href="..." ใน HTML ที่ชี้ไฟล์ในโฟลเดอร์เดียวกันถูกเติม ?v=<hash> ให้เอง
+  (เช่น <script src="chart.umd.js"> -> chart.umd.js?v=...) ไฟล์เปลี่ยน = URL เปลี่ยน
+
+ไฟล์เปลี่ยนตอน deploy เท่านั้น จึงไม่เช็ค mtime ซ้ำระหว่างรัน (restart = โหลดใหม่)
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import parse_qs
+from starlette.responses import PlainTextResponse, RedirectResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+MIN_COMPRESS_BYTES = 1024
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+CACHE_DEFAULT = "public, max-age=3600"
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+VERSION_CHARS = 16
+# reference แบบ relative ที่ยังไม่มี query / fragment (URL เต็ม เช่น https://... มี ':' จึงไม่ตรง)
+ASSET_REFERENCE = re.compile(r'(\b(?:src|href)=")([^"?#:]+)(")')
+
+# ลำดับที่เลือกเมื่อ client รับได้หลายแบบ (เล็กสุดก่อน)
+ENCODINGS = ("br", "gzip")
+
+
+class StaticAsset:
+    def __init__(self, path: Path, body: bytes | None = None):
+        body = path.read_bytes() if body is None else body
+        self.path = path
+        self.content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type == "application/javascript":
+            self.content_type += "; charset=utf-8"
+        self.version = hashlib.sha256(body).hexdigest()[:VERSION_CHARS]
+        self.last_modified = formatdate(path.stat().st_mtime, usegmt=True)
+        self.mtime = int(path.stat().st_mtime)
+        self.hashed_name = bool(HASHED_NAME.search(path.name))
+        self.is_html = self.content_type.startswith("text/html")
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+            # เก็บเฉพาะแบบที่เล็กกว่าต้นฉบับจริง
+            self.bodies = {k: v for k, v in self.bodies.items() if k == "identity" or len(v) < len(body)}
+
+    def etag(self, encoding: str) -> str:
+        # แต่ละ encoding เป็นคนละ representation จึงต้องมี ETag ของตัวเอง
+        return f'"{self.version}"' if encoding == "identity" else f'"{self.version}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {self.etag(encoding) for encoding in self.bodies}
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in candidates:
+                return True
+        return False
+
+    def cache_control(self, requested_version: str | None) -> str:
+        if self.hashed_name or (requested_version and requested_version == self.version):
+            return CACHE_IMMUTABLE
+        if self.is_html or requested_version:
+            return CACHE_REVALIDATE
+        return CACHE_DEFAULT
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    if "*" in accepted:
+        accepted.update(ENCODINGS)
+    return accepted
+
+
+def route_path(scope: Scope) -> str:
+    # path ที่เหลือหลัง mount (เช่น /web/index.html -> /index.html)
+    path, root_path = scope["path"], scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        return path[len(root_path):]
+    return path
+
+
+def version_references(assets: dict):
+    """
+    เติม ?v=<version> ให้ src / href ใน HTML ที่ชี้ไฟล์ใน assets (ไม่ใช่ HTML) ให้ browser cache ได้แบบ immutable
+    """
+    for name, asset in list(assets.items()):
+        if not asset.is_html:
+            continue
+        base = posixpath.dirname(name)
+
+        def versioned(match):
+            target = assets.get(posixpath.normpath(posixpath.join(base, match.group(2))))
+            if target is None or target.is_html:
+                return match.group(0)
+            return f"{match.group(1)}{match.group(2)}?v={target.version}{match.group(3)}"
+
+        html = asset.bodies["identity"].decode("utf-8")
+        rewritten = ASSET_REFERENCE.sub(versioned, html)
+        if rewritten != html:
+            assets[name] = StaticAsset(asset.path, rewritten.encode("utf-8"))
+
+
+class PrecompressedStaticFiles:
+    def __init__(self, directory: str, html: bool = True):
+        self.directory = Path(directory)
+        self.html = html
+        self.assets = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                return
+            assets = {}
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file():
+                    assets[path.relative_to(self.directory).as_posix()] = StaticAsset(path)
+            version_references(assets)
+            self.assets = assets
+            self.loaded = True
+        raw = sum(len(a.bodies["identity"]) for a in assets.values())
+        smallest = sum(min(len(b) for b in a.bodies.values()) for a in assets.values())
+        logger.info("static assets loaded dir=%s files=%d bytes=%d compressed=%d brotli=%s",
+                    self.directory, len(assets), raw, smallest, brotli is not None)
+
+    def lookup(self, path: str):
+        path = path.lstrip("/")
+        if self.html and (path == "" or path.endswith("/")):
+            path += "index.html"
+        return self.assets.get(path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self.loaded:
+            await asyncio.to_thread(self.load)
+
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            return await response(scope, receive, send)
+
+        path = route_path(scope)
+        if path == "" and self.html:
+            # /web -> /web/ ให้ relative link ในหน้า index ชี้ถูก
+            response = RedirectResponse(url=scope.get("root_path", "") + "/", status_code=307)
+            return await response(scope, receive, send)
+
+        asset = self.lookup(path)
+        if asset is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+            return await response(scope, receive, send)
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        requested_version = query.get("v", [None])[0]
+
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next((e for e in ENCODINGS if e in accepted and e in asset.bodies), "identity")
+        response_headers = {
+            "ETag": asset.etag(encoding),
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": asset.cache_control(requested_version),
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = asset.matches(if_none_match)
+        else:
+            not_modified = self._not_modified_since(asset, headers.get("if-modified-since"))
+        if not_modified:
+            return await Response(status_code=304, headers=response_headers)(scope, receive, send)
+
+        body = asset.bodies[encoding]
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        response = Response(
+            content=b"" if method == "HEAD" else body,
+            media_type=asset.content_type,
+            headers=response_headers,
+        )
+        response.headers["Content-Length"] = str(len(body))
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _not_modified_since(asset: StaticAsset, header: str | None) -> bool:
+        if not header:
+            return False
+        try:
+            since = parsedate_to_datetime(header)
+        except (TypeError, ValueError):
+            return False
+        return since is not None and asset.mtime <= int(since.timestamp())
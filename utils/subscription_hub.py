@@ -0,0 +1,302 @@
+"""
+รวม refresh loop ของ WebSocket ที่ขอข้อมูลชุดเดียวกัน (key เดียวกัน) ให้เหลือ task เดียวต่อ process
+
+feed หนึ่งตัว = loader + query + interval ที่ refresh ตามรอบ แล้วกระจาย payload (encode ครั้งเดียว)
+ให้ทุก subscriber: socket แบบเดิม (/ws/filter ฯลฯ) ได้ข้อมูลดิบ ส่วน /failures/ws ได้ห่อด้วย channel
+
+หลาย worker / หลาย pod (FEED_COORDINATION=true):
+- worker ที่ถือ lease ของ key นั้น (utils/redis_lease.py) เป็นคนเดียวที่ยิง DB
+  แล้ว publish payload ผ่าน Redis pub/sub (FEED_CHANNEL) + เก็บตัวล่าสุดไว้ให้ feed ที่เพิ่งเริ่ม
+- worker อื่นแค่ relay payload ที่ได้จาก pub/sub ให้ socket ของตัวเอง
+- owner ตาย / ไม่มี subscriber แล้ว = lease หมดอายุ / ถูกปล่อย worker อื่นที่ยังมี subscriber รับช่วงต่อ
+
+DB มีปัญหา (timeout / circuit breaker เปิด): ส่งข้อมูลล่าสุดที่ดีอยู่ต่อ โดย /failures/ws ได้ "stale": true
+subscriber คนสุดท้ายออกระหว่าง query = ยกเลิก query นั้นที่ DB ด้วย (db/query_guard.py)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from pydantic import BaseModel
+from db.config import FEED_COORDINATION, FEED_LAST_TTL_SEC, FEED_LEASE_TTL_SEC
+from db.circuit_breaker import CircuitOpenError
+from db.query_guard import CancelScope, run_cancellable
+from db.redis_client import r as redis_client
+from utils.metrics import FEED_REFRESHES, FEED_RELAYED, WS_FEEDS
+from utils.redis_lease import hold_lease, release_lease
+from utils.ws_connection import ManagedWebSocket
+
+logger = logging.getLogger(__name__)
+
+FEED_CHANNEL = "failures:feeds"
+# ต่ออายุ lease ทุก ttl/3 ทั้งระหว่างรอรอบถัดไป และระหว่าง refresh (task แยก ดู refresh_holding_lease)
+# query ที่ช้ากว่า ttl จึงไม่ทำให้ lease หลุดแล้ว worker อื่นยิง DB ซ้ำ
+LEASE_RENEW_SEC = FEED_LEASE_TTL_SEC / 3
+RELAY_POLL_TIMEOUT_SEC = 1.0
+
+
+def feed_key(kind: str, query: BaseModel) -> str:
+    return f"{kind}:{query.model_dump_json()}"
+
+
+def data_envelope(channel: str, payload: str, stale: bool = False, refreshed_at: float = 0.0) -> str:
+    # ต่อ string แทน json.dumps ทั้งก้อน เพื่อไม่ต้อง encode data ซ้ำต่อ subscriber
+    header = f'"channel":{json.dumps(channel)},"type":"data"'
+    if stale:
+        header += f',"stale":true,"refreshedAt":{json.dumps(datetime.fromtimestamp(refreshed_at).isoformat(timespec="seconds"))}'
+    return f'{{{header},"data":{payload}}}'
+
+
+def encode_message(feed_id: str, origin: str, refreshed_at: float, stale: bool, payload: str) -> str:
+    # payload จาก json.dumps ไม่มี newline ดิบ จึงใช้ newline คั่น header ได้โดยไม่ต้อง encode ซ้ำ
+    return f"{feed_id}\n{origin}\n{refreshed_at}\n{int(stale)}\n{payload}"
+
+
+def decode_message(message: str) -> tuple[str, str, float, bool, str]:
+    feed_id, origin, refreshed_at, stale, payload = message.split("\n", 4)
+    return feed_id, origin, float(refreshed_at), stale == "1", payload
+
+
+class Feed:
+    def __init__(self, hub: "SubscriptionHub", key: str, kind: str, loader, query: BaseModel, interval: float):
+        self.hub = hub
+        self.key = key
+        self.id = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        self.kind = kind
+        self.loader = loader
+        self.query = query
+        self.interval = interval
+        self.subscribers = {}  # (id(conn), channel) -> (conn, channel)
+        self.last_payload = None
+        self.refreshed_at = 0.0  # wall clock ที่ได้ last_payload มาจาก DB (จาก worker ไหนก็ได้)
+        self.attempted_at = 0.0  # refresh ครั้งล่าสุดที่ worker นี้ลอง (สำเร็จหรือไม่ก็ตาม)
+        self.stale = False
+        self.owner = False
+        self.task = None
+
+    @property
+    def lease_key(self) -> str:
+        return f"failures:feed:{self.id}:lease"
+
+    @property
+    def last_key(self) -> str:
+        return f"failures:feed:{self.id}:last"
+
+    def send(self, conn: ManagedWebSocket, channel: str | None, payload: str):
+        if channel is None:
+            conn.publish_text(payload)
+        else:
+            conn.publish_text(data_envelope(channel, payload, self.stale, self.refreshed_at), key=channel)
+
+    def deliver(self, payload: str, refreshed_at: float, stale: bool = False):
+        if refreshed_at < self.refreshed_at or (refreshed_at == self.refreshed_at and stale == self.stale):
+            return
+        marked_stale = stale and refreshed_at == self.refreshed_at
+        self.refreshed_at = refreshed_at
+        self.last_payload = payload
+        self.stale = stale
+        for conn, channel in list(self.subscribers.values()):
+            # socket แบบเดิมรับ array ล้วน ไม่มีที่ใส่ flag และมีข้อมูลชุดนี้อยู่แล้ว
+            if channel is None and marked_stale:
+                continue
+            self.send(conn, channel, payload)
+
+    async def refresh(self):
+        self.attempted_at = time.time()
+        scope = CancelScope()
+        try:
+            data = await asyncio.to_thread(run_cancellable, scope, self.loader, self.query)
+        except asyncio.CancelledError:
+            # ไม่มีใครรอผลแล้ว ยกเลิก statement ที่ยังรันอยู่ที่ DB (thread จะจบเองหลังจากนั้น)
+            scope.cancel()
+            raise
+        payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        refreshed_at = time.time()
+        FEED_REFRESHES.inc(type=self.kind)
+        self.deliver(payload, refreshed_at)
+        await self.share(stale=False)
+
+    async def refresh_holding_lease(self):
+        if not self.hub.coordinated:
+            return await self.refresh()
+        renewer = asyncio.create_task(self._renew_lease())
+        try:
+            await self.refresh()
+        finally:
+            renewer.cancel()
+
+    async def _renew_lease(self):
+        # refresh อาจนานถึง statement timeout (ไม่ต่ำกว่า ttl) ต่ออายุไปพร้อมกันจนกว่า refresh จะจบ
+        while True:
+            await asyncio.sleep(LEASE_RENEW_SEC)
+            await self.hold()
+
+    async def mark_stale(self):
+        if self.last_payload is None or self.stale:
+            return
+        self.deliver(self.last_payload, self.refreshed_at, stale=True)
+        await self.share(stale=True)
+
+    async def share(self, stale: bool):
+        message = encode_message(self.id, self.hub.worker_id, self.refreshed_at, stale, self.last_payload)
+        try:
+            await asyncio.to_thread(self.hub.share, self, message)
+        except Exception:
+            logger.warning("feed share failed key=%s", self.key, exc_info=True)
+
+    async def run(self):
+        await self.restore()
+        while self.subscribers:
+            if await self.hold():
+                if time.time() - max(self.refreshed_at, self.attempted_at) >= self.interval:
+                    try:
+                        await self.refresh_holding_lease()
+                    except CircuitOpenError:
+                        logger.warning("feed refresh skipped, DB circuit open key=%s", self.key)
+                        await self.mark_stale()
+                    except Exception:
+                        # feed ไม่ตาย รอบหน้าลองใหม่ ระหว่างนี้ subscriber ได้ข้อมูลล่าสุดที่มี (stale)
+                        logger.exception("feed refresh failed key=%s", self.key)
+                        await self.mark_stale()
+            await asyncio.sleep(self.next_wakeup())
+
+    def next_wakeup(self) -> float:
+        due_in = self.interval - (time.time() - max(self.refreshed_at, self.attempted_at))
+        if not self.hub.coordinated:
+            return due_in if due_in > 0 else self.interval
+        # ต้องตื่นมาต่ออายุ lease (owner) / เช็คว่า owner หายไปหรือยัง (worker อื่น) ก่อน ttl หมด
+        return min(due_in if due_in > 0 else self.interval, LEASE_RENEW_SEC)
+
+    async def hold(self) -> bool:
+        if not self.hub.coordinated:
+            return True
+        try:
+            owner = await asyncio.to_thread(
+                hold_lease, redis_client, self.lease_key, self.hub.worker_id, int(FEED_LEASE_TTL_SEC * 1000))
+        except Exception:
+            # Redis ใช้ไม่ได้ = refresh เองแบบ worker เดียว ดีกว่าไม่มีข้อมูล
+            logger.warning("feed lease unavailable key=%s, refreshing locally", self.key, exc_info=True)
+            owner = True
+        if owner != self.owner:
+            logger.info("feed %s lease key=%s", "acquired" if owner else "lost", self.key)
+            self.owner = owner
+        return owner
+
+    async def restore(self):
+        # ข้อมูลล่าสุดที่ owner (worker ไหนก็ได้) เก็บไว้ feed ใหม่จะได้ไม่ต้องยิง DB เองหรือรอรอบหน้า
+        try:
+            message = await asyncio.to_thread(redis_client.get, self.last_key)
+        except Exception:
+            logger.warning("feed restore failed key=%s", self.key, exc_info=True)
+            return
+        if message:
+            _, _, refreshed_at, stale, payload = decode_message(message)
+            self.deliver(payload, refreshed_at, stale)
+
+    def release(self):
+        if self.owner:
+            try:
+                release_lease(redis_client, self.lease_key, self.hub.worker_id)
+            except Exception:
+                logger.warning("feed lease release failed key=%s", self.key, exc_info=True)
+
+
+class SubscriptionHub:
+    def __init__(self, coordinated: bool = FEED_COORDINATION, worker_id: str | None = None):
+        self.coordinated = coordinated
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._feeds = {}       # key -> Feed
+        self._feeds_by_id = {}  # Feed.id -> Feed (message จาก pub/sub มีแค่ id)
+        self._relay_task = None
+        self._background = set()  # ถือ reference ของ task ที่ไม่ได้ await (กัน GC)
+
+    def subscribe(self, kind: str, loader, query: BaseModel, interval: float,
+                  conn: ManagedWebSocket, channel: str | None = None) -> str:
+        key = feed_key(kind, query)
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = self._feeds[key] = Feed(self, key, kind, loader, query, interval)
+            self._feeds_by_id[feed.id] = feed
+            feed.subscribers[(id(conn), channel)] = (conn, channel)
+            feed.task = asyncio.create_task(feed.run())
+            WS_FEEDS.inc(type=kind)
+            logger.debug("feed started key=%s", key)
+            if self.coordinated and (self._relay_task is None or self._relay_task.done()):
+                self._relay_task = asyncio.create_task(self._relay())
+        else:
+            feed.subscribers[(id(conn), channel)] = (conn, channel)
+            # subscriber ใหม่ได้ข้อมูลล่าสุดทันที ไม่ต้องรอรอบถัดไป
+            if feed.last_payload is not None:
+                feed.send(conn, channel, feed.last_payload)
+        return key
+
+    def unsubscribe(self, key: str, conn: ManagedWebSocket, channel: str | None = None):
+        feed = self._feeds.get(key)
+        if feed is None:
+            return
+        feed.subscribers.pop((id(conn), channel), None)
+        if channel is not None:
+            conn.discard(channel)
+        if not feed.subscribers:
+            feed.task.cancel()
+            del self._feeds[key]
+            del self._feeds_by_id[feed.id]
+            WS_FEEDS.dec(type=feed.kind)
+            logger.debug("feed stopped key=%s", key)
+            if feed.owner:
+                task = asyncio.create_task(asyncio.to_thread(feed.release))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    async def stream(self, conn: ManagedWebSocket, kind: str, loader, query: BaseModel, interval: float):
+        """
+        สำหรับ socket แบบเดิมที่ผูก 1 connection กับ 1 query: subscribe แล้วรอจน connection ปิด
+        """
+        key = self.subscribe(kind, loader, query, interval, conn)
+        try:
+            await conn.wait_closed()
+        finally:
+            self.unsubscribe(key, conn)
+
+    def share(self, feed: Feed, message: str):
+        # เก็บตัวล่าสุดเสมอ (ใช้เป็นข้อมูล stale ตอน feed เริ่มใหม่ระหว่าง DB ล่ม) publish เฉพาะหลาย worker
+        pipe = redis_client.pipeline()
+        pipe.setex(feed.last_key, FEED_LAST_TTL_SEC, message)
+        if self.coordinated:
+            pipe.publish(FEED_CHANNEL, message)
+        pipe.execute()
+
+    async def _relay(self):
+        """
+        รับ payload ที่ worker อื่น (owner) publish แล้วส่งต่อให้ feed ในเครื่อง หยุดเองเมื่อไม่มี feed
+        """
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(FEED_CHANNEL)
+            while self._feeds:
+                try:
+                    message = await asyncio.to_thread(pubsub.get_message, timeout=RELAY_POLL_TIMEOUT_SEC)
+                except Exception:
+                    logger.warning("feed relay failed, retrying", exc_info=True)
+                    await asyncio.sleep(RELAY_POLL_TIMEOUT_SEC)
+                    continue
+                if not message:
+                    continue
+                feed_id, origin, refreshed_at, stale, payload = decode_message(message["data"])
+                feed = self._feeds_by_id.get(feed_id)
+                if feed is None or origin == self.worker_id:
+                    continue
+                FEED_RELAYED.inc(type=feed.kind)
+                feed.deliver(payload, refreshed_at, stale)
+        except Exception:
+            logger.exception("feed relay stopped")
+        finally:
+            pubsub.close()
+
+
+hub = SubscriptionHub()
@@ -0,0 +1,190 @@
+"""
+WebSocket ที่มีคิวส่งจำกัดขนาด + timeout ต่อการส่ง กัน client ช้าตัวเดียวถ่วงทั้งระบบ
+
+- publish() ไม่ await: ใส่ payload ลงคิวแล้วให้ sender task ส่งเอง
+  ข้อมูลแบบ snapshot (ทั้งก้อน) ใช้ coalesce=True = ทิ้งของเก่าที่ยังไม่ได้ส่ง เหลือแค่ล่าสุด
+  ข้อมูลแบบ event (เช่น alert) ใช้ coalesce=False = คิวเต็มแล้วทิ้งตัวเก่าสุด
+- ส่งไม่เสร็จใน SEND_TIMEOUT_SEC = client ค้าง ตัดทิ้ง
+- client ส่ง "ping" มาได้ จะได้ "pong" กลับ และถ้าเคย ping แล้วเงียบเกิน IDLE_TIMEOUT_SEC จะถูกตัด
+  (ping/pong ระดับ protocol ของ browser ให้ uvicorn จัดการ: --ws-ping-interval / --ws-ping-timeout)
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from utils.metrics import WS_ACTIVE, WS_DROPPED, WS_EVICTED, WS_PAYLOAD_BYTES, WS_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_MAX = 8
+SEND_TIMEOUT_SEC = 10.0
+IDLE_TIMEOUT_SEC = 90.0
+WATCHDOG_INTERVAL_SEC = 5.0
+CLOSE_TIMEOUT_SEC = 1.0
+
+# close code ตาม RFC 6455
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class ManagedWebSocket:
+    def __init__(self, websocket: WebSocket, endpoint: str,
+                 max_queue: int = SEND_QUEUE_MAX,
+                 send_timeout: float = SEND_TIMEOUT_SEC,
+                 idle_timeout: float = IDLE_TIMEOUT_SEC):
+        self.websocket = websocket
+        self.endpoint = endpoint
+        self.send_timeout = send_timeout
+        self.idle_timeout = idle_timeout
+        self.close_reason = None
+        self.last_seen = time.monotonic()
+        self.heartbeat_enabled = False
+        self._socket_closed = False
+        self._queue = deque(maxlen=max_queue)  # event ที่ต้องส่งครบตามลำดับ
+        self._latest = {}                       # snapshot ล่าสุดที่ยังไม่ได้ส่ง แยกตาม key (channel)
+        self._wakeup = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._tasks = []
+
+    async def __aenter__(self):
+        WS_ACTIVE.inc(endpoint=self.endpoint)
+        self._tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._receive_loop()),
+            asyncio.create_task(self._watchdog()),
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._mark_closed(self.close_reason or "server")
+        for task in self._tasks:
+            task.cancel()
+        try:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            if self.close_reason not in ("client", "send_error"):
+                await self._close_socket(CLOSE_GOING_AWAY)
+        finally:
+            WS_ACTIVE.dec(endpoint=self.endpoint)
+            logger.info("%s connection closed reason=%s", self.endpoint, self.close_reason)
+        return False
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed.is_set()
+
+    def publish(self, data, coalesce: bool = True, key: str = ""):
+        payload = data if isinstance(data, str) else json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self.publish_text(payload, coalesce, key)
+
+    def publish_text(self, payload: str, coalesce: bool = True, key: str = ""):
+        """
+        coalesce ทำแยกตาม key: socket เดียวที่มีหลาย channel จะไม่ทับข้อมูลของ channel อื่น
+        """
+        if not self.alive:
+            return
+        if coalesce:
+            if key in self._latest:
+                WS_DROPPED.inc(endpoint=self.endpoint)
+            self._latest[key] = payload
+        else:
+            if len(self._queue) == self._queue.maxlen:
+                # deque(maxlen) ทิ้งตัวเก่าสุดให้เอง
+                WS_DROPPED.inc(endpoint=self.endpoint)
+            self._queue.append(payload)
+        self._wakeup.set()
+
+    def _next_payload(self):
+        if self._queue:
+            return self._queue.popleft()
+        if self._latest:
+            return self._latest.pop(next(iter(self._latest)))
+        return None
+
+    def discard(self, key: str):
+        # ทิ้ง snapshot ที่ค้างของ channel ที่เลิก subscribe แล้ว
+        self._latest.pop(key, None)
+
+    async def wait_closed(self, timeout: float | None = None) -> bool:
+        """
+        ใช้แทน asyncio.sleep ใน loop: ตื่นทันทีถ้า connection ปิดระหว่างรอ (timeout=None = รอจนปิด)
+        """
+        waiter = asyncio.ensure_future(self._closed.wait())
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            waiter.cancel()
+        return bool(done)
+
+    def on_message(self, message: str):
+        """
+        hook สำหรับข้อความจาก client ที่ไม่ใช่ "ping" (subclass override)
+        """
+
+    def _mark_closed(self, reason: str):
+        if not self._closed.is_set():
+            self.close_reason = reason
+            self._closed.set()
+            self._wakeup.set()
+
+    async def _evict(self, reason: str, code: int):
+        logger.warning("%s evicting client reason=%s", self.endpoint, reason)
+        WS_EVICTED.inc(endpoint=self.endpoint, reason=reason)
+        self._mark_closed(reason)
+        await self._close_socket(code)
+
+    async def _close_socket(self, code: int):
+        if self._socket_closed or self.websocket.application_state != WebSocketState.CONNECTED:
+            return
+        self._socket_closed = True
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), CLOSE_TIMEOUT_SEC)
+        except Exception:
+            pass
+
+    async def _send_loop(self):
+        while self.alive:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.alive:
+                payload = self._next_payload()
+                if payload is None:
+                    break
+                WS_PAYLOAD_BYTES.observe(len(payload.encode("utf-8")), endpoint=self.endpoint)
+                started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+                except asyncio.TimeoutError:
+                    await self._evict("send_timeout", CLOSE_TRY_AGAIN_LATER)
+                    return
+                except Exception as e:
+                    # client ปิดไปแล้วระหว่างส่ง
+                    logger.info("%s send failed: %r", self.endpoint, e)
+                    self._mark_closed("send_error")
+                    return
+                WS_SEND_SECONDS.observe(time.perf_counter() - started, endpoint=self.endpoint)
+
+    async def _receive_loop(self):
+        while self.alive:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                self._mark_closed("client")
+                return
+            self.last_seen = time.monotonic()
+            text = message.get("text")
+            if text is None:
+                continue
+            if text == "ping":
+                self.heartbeat_enabled = True
+                self.publish_text("pong", coalesce=False)
+            else:
+                self.on_message(text)
+
+    async def _watchdog(self):
+        while self.alive:
+            await asyncio.sleep(WATCHDOG_INTERVAL_SEC)
+            if self.heartbeat_enabled and time.monotonic() - self.last_seen > self.idle_timeout:
+                await self._evict("idle", CLOSE_GOING_AWAY)
+                return